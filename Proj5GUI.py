@@ -6,6 +6,7 @@ import signal
 import sys
 import time
 import cProfile
+import traceback
 
 from which_pyqt import PYQT_VER
 if PYQT_VER == 'PYQT5':
@@ -27,6 +28,8 @@ else:
 # Import in the code with the actual implementation
 from TSPSolver import *
 from TSPClasses import *
+from TSPCache import TSPCache
+import functools
 from PyQt5.QtWidgets import QApplication
 
 
@@ -193,6 +196,51 @@ class PointLineView( QWidget ):
 
 
 
+''' <summary>
+	Runs one solve on a QThread so the window stays responsive.  The solver's improved
+	tours and periodic counters are sent to the GUI thread as signals, and cancel()
+	makes the next callback or progress call tell the solver to stop.
+	</summary>
+'''
+
+class SolverWorker( QObject ):
+	improved	= pyqtSignal( object, object )
+	progressed	= pyqtSignal( object )
+	finished	= pyqtSignal( object )
+	failed		= pyqtSignal( str )
+
+	def __init__( self, solve_func, time_allowance ):
+		super(SolverWorker,self).__init__()
+		self.solve_func = solve_func
+		self.time_allowance = time_allowance
+		self.cancelled = False
+
+	def run( self ):
+		try:
+			results = self.solve_func( time_allowance=self.time_allowance, callback=self.solutionFound, \
+									   progress=self.progressMade )
+		except ValueError as e:											# an instance the solver refuses
+			self.failed.emit( str(e) )
+			return
+		except Exception as e:											# anything else must still re-enable the window
+			traceback.print_exc()
+			self.failed.emit( 'Solver failed: {}: {}'.format(type(e).__name__, e) )
+			return
+		self.finished.emit( results )
+
+	def solutionFound( self, solution, progress ):
+		self.improved.emit( solution, progress )
+		return self.cancelled
+
+	def progressMade( self, stats ):
+		self.progressed.emit( stats )
+		return self.cancelled
+
+	def cancel( self ):
+		self.cancelled = True
+
+
+
 class Proj5GUI( QMainWindow ):
 
 	def __init__( self , mode):
@@ -204,36 +252,30 @@ class Proj5GUI( QMainWindow ):
 			self._MAX_SEED = 1000 
 
 			self._scenario = None
+			self._solution = None
+			self._solveThread = None
+			self._solveWorker = None
+			self._cache = TSPCache()						# scenarios and best tours of recent settings, in memory
+			self._cacheKey = None
 			self.initUI()
 			self.solver = TSPSolver( self.view )
 			self.genParams = {'size':None,'seed':None,'diff':None}
 
 
 	   
-	def newPoints(self):		
-		# TODO - ERROR CHECKING!!!!
-		seed = int(self.curSeed.text())
-		random.seed( seed )
-
-		ptlist = []
-		RANGE = self.data_range
-		xr = self.data_range['x']
-		yr = self.data_range['y']
-		npoints = int(self.size.text())
-		while len(ptlist) < npoints:
-			x = random.uniform(0.0,1.0)
-			y = random.uniform(0.0,1.0)
-			if True:
-				xval = xr[0] + (xr[1]-xr[0])*x
-				yval = yr[0] + (yr[1]-yr[0])*y
-				ptlist.append( QPointF(xval,yval) )
-		return ptlist
+	def newPoints(self):
+		return newPoints( int(self.size.text()), int(self.curSeed.text()) )
 
 	def generateNetwork(self):
-		points = self.newPoints() # uses current rand seed
 		diff = self.diffDropDown.currentText()
 		rand_seed = int(self.curSeed.text())
-		self._scenario = Scenario( city_locations=points, difficulty=diff, rand_seed=rand_seed )
+		if diff == 'Hard':								# a new random graph every time, nothing to reuse
+			points = self.newPoints() # uses current rand seed
+			self._scenario = Scenario( city_locations=points, difficulty=diff, rand_seed=rand_seed )
+			self._cacheKey = None
+		else:
+			self._cacheKey = TSPCache.key( self.size.text(), rand_seed, diff )
+			self._scenario = self._cache.scenario( self._cacheKey )
 
 		self.genParams = {'size':self.size.text(),'seed':self.curSeed.text(),'diff':diff}
 		self.view.clearEdges()
@@ -266,7 +308,7 @@ class Proj5GUI( QMainWindow ):
 		self.view.repaint()
 
 
-	def displaySolution( self ) :						# what about calling this somehow every time a new bssf is found?
+	def displaySolution( self ) :						# also called by solutionFound every time a new bssf is found
 		self.view.clearEdges([(64,64,255)])				# get rid of edge labels but not point labels
 		if self._solution:
 			self.addCities()
@@ -288,16 +330,34 @@ class Proj5GUI( QMainWindow ):
 
 
 
+	def solutionFound( self, solution, progress ):		# SolverWorker signal: show every new bssf while solving
+		self._solution = solution
+		self.tourCost.setText( '{}'.format(solution.cost) )
+		gap = ', gap {:.2%}'.format( progress['gap'] ) if progress['gap'] is not None else ''
+		self.statusBar.showMessage( 'Processing... {:.2f} s, {} states{}'.format(
+			progress['time'], progress['states'], gap) )
+		self.displaySolution()
+
+	def progressMade( self, stats ):					# SolverWorker signal: periodic counters from the solver
+		fields = {'count':self.numSolutions, 'cost':self.tourCost, 'max':self.maxQSize, \
+				  'total':self.totalStates, 'pruned':self.prunedStates}
+		for key, value in stats.items():
+			if key in fields:
+				fields[key].setText( '{}'.format(value) )
+		if 'queue' in stats:
+			self.maxQSize.setText( '{} (now {})'.format(stats['max'], stats['queue']) )
+		if self._solveWorker is not None and not self._solveWorker.cancelled:
+			self.statusBar.showMessage( 'Processing... {:.0f} s'.format(time.time() - self._solveStart) )
+
 	def randSeedClicked(self):
 		new_seed = random.randint(0, self._MAX_SEED-1)
 		self.curSeed.setText( '{}'.format(new_seed) )
 		self.view.repaint()
 
-	def solveClicked(self):								# need to reset display??? and say "processing..." at bottom???
+	def solveClicked(self):
 		self.solver.setupWithScenario(self._scenario)
 
 		max_time = float( self.timeLimit.text() )
-		# TODO - start on a separate thread
 		self.view.clearEdges([(64,64,255)])				# get rid of edge labels but not point labels
 		self.numSolutions.setText( '--' )
 		self.tourCost.setText( '--' )
@@ -306,16 +366,48 @@ class Proj5GUI( QMainWindow ):
 		self.totalStates.setText( '--' )
 		self.prunedStates.setText( '--' )
 		self.statusBar.showMessage('Processing...')
-		#self.view.repaint()
-		#app.processEvents()
-		solve_func = 'self.solver.'+self.ALGORITHMS[self.algDropDown.currentIndex()][1]
-		results = eval(solve_func)(time_allowance=max_time )
+		self._solution = None
+		self._solveAlgorithm = self.ALGORITHMS[self.algDropDown.currentIndex()][1]
+		solve_func = getattr( self.solver, self._solveAlgorithm )
+		best = self._cache.bestTour( self._cacheKey ) if self._cacheKey is not None else None
+		if solve_func == self.solver.branchAndBound and best is not None:
+			solve_func = functools.partial( solve_func, initial_tour=best[1] )	# warm start from the best tour so far
+
+		self._solveStart = time.time()
+		self._solveThread = QThread()
+		self._solveWorker = SolverWorker( solve_func, max_time )
+		self._solveWorker.moveToThread( self._solveThread )
+		self._solveThread.started.connect( self._solveWorker.run )
+		self._solveWorker.improved.connect( self.solutionFound )
+		self._solveWorker.progressed.connect( self.progressMade )
+		self._solveWorker.finished.connect( self.solveFinished )
+		self._solveWorker.failed.connect( self.solveFailed )
+		self._solveWorker.finished.connect( self._solveThread.quit )
+		self._solveWorker.failed.connect( self._solveThread.quit )
+		self._solveThread.finished.connect( self.solveStopped )
+		self.solveButton.setEnabled(False)
+		self.generateButton.setEnabled(False)
+		self.cancelButton.setEnabled(True)
+		self._solveThread.start()
+
+	def cancelClicked(self):
+		if self._solveWorker is not None:
+			self._solveWorker.cancel()
+			self.cancelButton.setEnabled(False)
+			self.statusBar.showMessage('Cancelling...')
+
+	def solveFailed(self, message):						# refused instances and solver errors
+		self.statusBar.showMessage( message )
+
+	def solveFinished(self, results):
 		if results:
-			self.statusBar.showMessage('')
+			self.statusBar.showMessage('Cancelled.' if self._solveWorker.cancelled else '')
 			self.numSolutions.setText( '{}'.format(results['count']) )
 			self.tourCost.setText( '{}'.format(results['cost']) )
 			self.solvedIn.setText( '{:6.6f} seconds'.format(results['time']) )
 			self._solution = results['soln']
+			if self._cacheKey is not None and self._solution is not None:
+				self._cache.recordTour( self._cacheKey, self._solveAlgorithm, self._solution )
 			if 'max' in results.keys():
 				self.maxQSize.setText( '{}'.format(results['max']))
 			if 'total' in results.keys():
@@ -327,9 +419,23 @@ class Proj5GUI( QMainWindow ):
 		else:
 			print( 'GOT NULL SOLUTION BACK!!' )		#probably shouldn't ever use this...
 		self.view.repaint()
-#		app.processEvents()
+
+	def solveStopped(self):								# the worker thread has exited
+		self._solveThread = None
+		self._solveWorker = None
+		self.cancelButton.setEnabled(False)
+		self.solveButton.setEnabled(True)
+		self.checkGenInputs()
+
+	def closeEvent(self, event):
+		if self._solveThread is not None:
+			self._solveWorker.cancel()
+			self._solveThread.wait()
+		super(Proj5GUI,self).closeEvent(event)
 
 	def checkGenInputs(self):
+		if self._solveThread is not None:				# buttons stay disabled until the solve is done
+			return
 		seed  = self.curSeed.text()
 		size = self.size.text()
 		diff = self.diffDropDown.currentText()
@@ -376,7 +482,10 @@ class Proj5GUI( QMainWindow ):
 		('Default                            ','defaultRandomTour'), \
 		('Greedy','greedy'), \
 		('Branch and Bound','branchAndBound'), \
-		('Fancy','fancy') \
+		('Fancy','fancy'), \
+		('3-opt + kicks','threeOpt'), \
+		('Simulated Annealing','simulatedAnnealing'), \
+		('Held-Karp (exact, small n)','heldKarp') \
 	]															# whitespace hack to get longest to display correctly
 
 	def initUI( self ):
@@ -392,14 +501,13 @@ class Proj5GUI( QMainWindow ):
 		self.setCentralWidget( boxwidget )
 
 
-		SCALE = 1.0
-		self.data_range		= { 'x':[-1.5*SCALE,1.5*SCALE], \
-								'y':[-SCALE,SCALE] }
+		self.data_range		= DATA_RANGE
 		self.view			= PointLineView( self.statusBar, \
 											 self.data_range )
 		self.randSeedButton = QPushButton('Randomize Seed')
 		self.generateButton = QPushButton('Generate Scenario')
 		self.solveButton	= QPushButton('Solve TSP')
+		self.cancelButton	= QPushButton('Cancel')
 
 		self.curSeed		= QLineEdit('20')
 		self.curSeed.setFixedWidth(100)
@@ -468,6 +576,7 @@ class Proj5GUI( QMainWindow ):
 		h.addWidget( self.timeLimit )
 		h.addWidget( QLabel( 'seconds' ) )
 		h.addWidget( self.solveButton )
+		h.addWidget( self.cancelButton )
 		h.addStretch(1)
 		vbox.addLayout(h)
 
@@ -487,6 +596,7 @@ class Proj5GUI( QMainWindow ):
 
 		self.lastPath = (None,None)
 		self.solveButton.setEnabled(False)
+		self.cancelButton.setEnabled(False)
 
 		self.curSeed.textChanged.connect(self.checkGenInputs)
 		self.size.textChanged.connect(self.checkGenInputs)
@@ -494,6 +604,7 @@ class Proj5GUI( QMainWindow ):
 		self.randSeedButton.clicked.connect(self.randSeedClicked)
 		self.generateButton.clicked.connect(self.generateClicked)
 		self.solveButton.clicked.connect(self.solveClicked)
+		self.cancelButton.clicked.connect(self.cancelClicked)
 
 		self.diffDropDown.addItem('Easy                               ')					# Weird hack to make box wide enough to show all of last item
 		self.diffDropDown.addItem('Normal')
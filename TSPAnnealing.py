@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+
+import time
+import numpy as np
+from TSPLocalSearch import penalizedCosts
+
+
+
+''' <summary>
+	Cooling schedules for TSPAnnealing: the temperature as a function of the fraction
+	of the time allowance used so far, going from start to end.  A start or end left
+	as None is calibrated from the tour (see TSPAnnealing.calibrate).
+	</summary>
+'''
+
+class GeometricCooling:
+	def __init__( self, start=None, end=None ):
+		self.start = start
+		self.end = end
+
+	def temperature( self, fraction, start, end ):
+		return start * (end / start) ** fraction
+
+class LinearCooling( GeometricCooling ):
+	def temperature( self, fraction, start, end ):
+		return start + (end - start) * fraction
+
+
+
+''' <summary>
+	Simulated annealing for asymmetric costs with moves whose cost change is found in
+	O(1): swapping two cities, and moving a segment of 1 to MAX_SEGMENT cities (in its
+	direction) to after another city.  Neither reverses part of the tour, so no edge
+	changes direction and the delta is a handful of matrix lookups.  The tour is kept
+	as successor and predecessor lists, so accepted moves are O(1) as well.
+
+	Moves are drawn BLOCK at a time with NumPy, together with the acceptance
+	thresholds -T ln(u) (a move is accepted if its delta is below it, i.e. with
+	probability exp(-delta / T)), so the inner loop is only lookups and comparisons;
+	in plain Python that is still only a few hundred thousand moves a second.
+	Accepted moves log the successors they overwrite, and at the end of a block in
+	which the best tour improved it is rebuilt from the current tour by undoing the
+	moves made after it, so the O(n) copy happens once per block at most.  The
+	temperature, deadline and callbacks are checked between blocks.  total counts
+	the moves evaluated; draws that are not a move (b next to a, or a segment
+	running into b) are skipped without being counted.  Missing edges
+	cost a large penalty (TSPLocalSearch.penalizedCosts), so the tour can pass through
+	them and be repaired.
+	</summary>
+'''
+
+class TSPAnnealing:
+	BLOCK = 20000
+	MAX_SEGMENT = 3
+	START_RATIO = 0.3													# start temperature / mean edge cost when calibrated
+	END_RATIO = 1e-3													# end temperature / start temperature when calibrated
+	PROGRESS_INTERVAL = 0.25											# seconds between onProgress calls
+
+	def __init__( self, costMatrix, route, schedule=None, seed=None ):
+		self._costMatrix = costMatrix
+		self.costs = penalizedCosts( costMatrix )
+		self.n = len(route)
+		self.succ = [0] * self.n
+		self.pred = [0] * self.n
+		for i, city in enumerate(route):
+			next = route[(i + 1) % self.n]
+			self.succ[city] = next
+			self.pred[next] = city
+		self.cost = sum( self.costs[city][self.succ[city]] for city in route )
+		self.bestCost = self.cost
+		self._bestSucc = list(self.succ)
+		self._start = route[0] if self.n else 0
+		self.schedule = schedule if schedule is not None else GeometricCooling()
+		self._rng = np.random.default_rng( seed )
+		self.total = 0
+		self.accepted = 0
+		self.improvements = 0
+
+	@property
+	def rejected( self ):
+		return self.total - self.accepted
+
+	def tour( self, succ=None ):
+		succ = succ if succ is not None else self.succ
+		route = [self._start]
+		for i in range(self.n - 1):
+			route.append( succ[route[-1]] )
+		return route
+
+	''' <summary>
+		The schedule's start and end temperatures, filling in a missing start with
+		START_RATIO of the current tour's mean edge cost (missing edges left out, their
+		penalty is no measure of a move), and a missing end with END_RATIO of the start.
+		</summary>
+	'''
+	def calibrate( self ):
+		start, end = self.schedule.start, self.schedule.end
+		if start is None:
+			edges = self._costMatrix[np.arange(self.n), self.succ]
+			edges = edges[np.isfinite(edges)]
+			start = self.START_RATIO * float(edges.mean()) if len(edges) and edges.mean() > 0 else 1.0
+		if end is None:
+			end = start * self.END_RATIO
+		return start, end
+
+	''' <summary>
+		Anneals until the deadline.  onImprove(route, cost) is called between blocks
+		when the best tour has improved, and onProgress() every PROGRESS_INTERVAL
+		seconds; if either returns True the search stops.
+		</summary>
+		<returns>the best route found as a list of city indices</returns>
+	'''
+	def anneal( self, deadline, onImprove=None, onProgress=None ):
+		n = self.n
+		if n < 5:
+			return self.tour()
+		c, succ, pred = self.costs, self.succ, self.pred
+		start, end = self.calibrate()
+		began = time.time()
+		span = max( deadline - began, 1e-9 )
+		cost, bestCost, bestSucc = self.cost, self.bestCost, self._bestSucc
+		reported = bestCost
+		nextProgress = began + self.PROGRESS_INTERVAL
+		accepted = evaluated = 0
+		changes = []														# (city, its old successor) for every accepted move this block
+		bestMark = None														# len(changes) when the best tour was found this block
+		while True:
+			now = time.time()
+			if now >= deadline:
+				break
+			if onImprove is not None and bestCost < reported:
+				reported = bestCost
+				if onImprove( self.tour(bestSucc), bestCost ):
+					break
+			if onProgress is not None and now >= nextProgress:
+				nextProgress = now + self.PROGRESS_INTERVAL
+				self.accepted += accepted
+				self.total += evaluated
+				accepted = evaluated = 0
+				if onProgress():
+					break
+			temperature = self.schedule.temperature( min(1.0, (now - began) / span), start, end )
+			moves = zip( self._rng.integers(0, n, self.BLOCK).tolist(), self._rng.integers(0, n, self.BLOCK).tolist(),
+						 self._rng.integers(0, self.MAX_SEGMENT + 1, self.BLOCK).tolist(),
+						 (-temperature * np.log(1.0 - self._rng.random(self.BLOCK))).tolist() )
+			for a, b, length, threshold in moves:
+				pa = pred[a]
+				if length == 0:												# swap a and b
+					sa = succ[a]
+					if b == a or b == sa or b == pa:
+						continue
+					evaluated += 1
+					pb, sb = pred[b], succ[b]
+					ca, cb = c[a], c[b]
+					delta = c[pa][b] + cb[sa] + c[pb][a] + ca[sb] - c[pa][a] - ca[sa] - c[pb][b] - cb[sb]
+					if delta < threshold:
+						changes += (pa, a, b, sb, pb, b, a, sa)
+						succ[pa] = b; pred[b] = pa; succ[b] = sa; pred[sa] = b
+						succ[pb] = a; pred[a] = pb; succ[a] = sb; pred[sb] = a
+					else:
+						continue
+				else:														# move the length cities from a to after b
+					if b == pa or b == a:
+						continue
+					e = a
+					for i in range(length - 1):
+						e = succ[e]
+						if e == b or e == pa:
+							break
+					if e == b or e == pa:
+						continue
+					evaluated += 1
+					se, sb = succ[e], succ[b]
+					delta = c[pa][se] + c[b][a] + c[e][sb] - c[pa][a] - c[e][se] - c[b][sb]
+					if delta < threshold:
+						changes += (pa, a, b, sb, e, se)
+						succ[pa] = se; pred[se] = pa
+						succ[b] = a; pred[a] = b
+						succ[e] = sb; pred[sb] = e
+					else:
+						continue
+				accepted += 1
+				cost += delta
+				if cost < bestCost:
+					bestCost = cost
+					bestMark = len(changes)
+					self.improvements += 1
+			if bestMark is not None:										# the current tour without the moves after the best
+				bestSucc = succ[:]
+				for i in range(len(changes) - 2, bestMark - 2, -2):
+					bestSucc[changes[i]] = changes[i + 1]
+				bestMark = None
+			changes.clear()
+		self.accepted += accepted
+		self.total += evaluated
+		self.cost, self.bestCost, self._bestSucc = cost, bestCost, bestSucc
+		if onImprove is not None and bestCost < reported:
+			onImprove( self.tour(bestSucc), bestCost )
+		return self.tour( bestSucc )
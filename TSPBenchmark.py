@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+
+''' <summary>
+	Headless benchmark harness.  Generates scenarios the same way Proj5GUI does
+	(TSPClasses.newScenario, without opening a window), runs the requested TSPSolver
+	algorithms over a grid of sizes, seeds and time limits, and writes one row per
+	run to CSV and/or JSON plus a summary table.
+
+	python3 TSPBenchmark.py --sizes 10 15 --seeds 20 21 22 --algorithms greedy branchAndBound --csv runs.csv
+
+	With --tsplib the scenarios are TSPLIB instances read from files instead (see
+	TSPLib); each row's difficulty is the file name and, when an .opt.tour file sits
+	next to the instance, 'optimum' is that tour's cost.
+	</summary>
+'''
+
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import math
+import os
+import statistics
+import sys
+
+from TSPClasses import Scenario, newScenario
+from TSPSolver import TSPSolver
+from TSPCache import TSPCache
+import TSPLib
+
+
+
+DIFFICULTIES = ['Easy', 'Normal', 'Hard', 'Hard (Deterministic)']
+ALGORITHMS = ['defaultRandomTour', 'greedy', 'branchAndBound']
+FIELDS = ['algorithm', 'difficulty', 'size', 'seed', 'time_limit',
+		  'cost', 'time', 'count', 'max', 'total', 'pruned']
+
+
+
+''' <summary>
+	Runs one algorithm on one scenario.  With a TSPCache the scenario comes from the
+	cache, branch and bound starts from the best tour cached for it by any algorithm,
+	and the tour found is cached for the next run.
+	</summary>
+'''
+def runOne( algorithm, difficulty, size, seed, time_limit, generator_version=None, cache=None ):
+	solver = TSPSolver( None )
+	options = {}
+	if cache is not None:
+		key = TSPCache.key( size, seed, difficulty, generator_version )
+		solver.setupWithScenario( cache.scenario(key) )
+		best = cache.bestTour( key )
+		if algorithm == 'branchAndBound' and best is not None:
+			options['initial_tour'] = best[1]
+	else:
+		solver.setupWithScenario( newScenario(size, seed, difficulty, generator_version) )
+	with contextlib.redirect_stdout( io.StringIO() ):
+		results = getattr( solver, algorithm )( time_allowance=time_limit, **options )
+	if cache is not None and results.get('soln') is not None:
+		cache.recordTour( key, algorithm, results['soln'] )
+	row = { 'algorithm':algorithm, 'difficulty':difficulty, 'size':size,
+			'seed':seed, 'time_limit':time_limit }
+	for field in FIELDS[5:]:
+		row[field] = results.get(field)
+	return row
+
+
+''' <summary>
+	Runs one algorithm on a TSPLIB instance, see the module summary.
+	</summary>
+'''
+def runFile( algorithm, path, time_limit ):
+	scenario = TSPLib.readTSPLIB( path )
+	solver = TSPSolver( None )
+	solver.setupWithScenario( scenario )
+	with contextlib.redirect_stdout( io.StringIO() ):
+		results = getattr( solver, algorithm )( time_allowance=time_limit )
+	row = { 'algorithm':algorithm, 'difficulty':os.path.basename(path), 'size':len(scenario.getCities()),
+			'seed':None, 'time_limit':time_limit }
+	for field in FIELDS[5:]:
+		row[field] = results.get(field)
+	optimal = os.path.splitext( path )[0] + '.opt.tour'
+	row['optimum'] = int(scenario.tourCosts( TSPLib.readTour(optimal) )[0]) if os.path.exists( optimal ) else None
+	return row
+
+
+def runGrid( algorithms, difficulties, sizes, seeds, time_limits, progress=None, generator_version=None, cache=None ):
+	rows = []
+	for difficulty, size, time_limit, algorithm, seed in itertools.product(
+			difficulties, sizes, time_limits, algorithms, seeds ):
+		row = runOne( algorithm, difficulty, size, seed, time_limit, generator_version, cache )
+		rows.append( row )
+		if progress:
+			progress( row )
+	return rows
+
+
+''' <summary>
+	Groups the runs by everything except the seed.  Cost statistics only use runs
+	that found a tour; 'solved' counts them.
+	</summary>
+'''
+def summarize( rows ):
+	groups = {}
+	for row in rows:
+		key = (row['algorithm'], row['difficulty'], row['size'], row['time_limit'])
+		groups.setdefault( key, [] ).append( row )
+
+	summary = []
+	for key, group in groups.items():
+		costs = [r['cost'] for r in group if r['cost'] is not None and r['cost'] < math.inf]
+		times = [r['time'] for r in group]
+		summary.append( { 'algorithm':key[0], 'difficulty':key[1], 'size':key[2], 'time_limit':key[3],
+						  'runs':len(group), 'solved':len(costs),
+						  'cost_mean':statistics.mean(costs) if costs else math.inf,
+						  'cost_median':statistics.median(costs) if costs else math.inf,
+						  'cost_min':min(costs) if costs else math.inf,
+						  'cost_max':max(costs) if costs else math.inf,
+						  'time_mean':statistics.mean(times),
+						  'time_median':statistics.median(times),
+						  'time_stdev':statistics.stdev(times) if len(times) > 1 else 0.0 } )
+	return summary
+
+
+def writeCsv( rows, path ):
+	with open( path, 'w', newline='' ) as f:
+		writer = csv.DictWriter( f, fieldnames=list(rows[0].keys()) )
+		writer.writeheader()
+		writer.writerows( rows )
+
+
+def writeJson( rows, summary, path ):
+	with open( path, 'w' ) as f:
+		json.dump( {'runs':rows, 'summary':summary}, f, indent=1 )
+
+
+def printSummary( summary, out=sys.stdout ):
+	header = '{:<18} {:<21} {:>6} {:>7} {:>7} {:>12} {:>12} {:>10}'
+	print( header.format('algorithm', 'difficulty', 'size', 'limit', 'solved',
+						 'cost mean', 'cost median', 'time mean'), file=out )
+	for s in summary:
+		print( '{:<18} {:<21} {:>6} {:>7g} {:>3}/{:<3} {:>12.1f} {:>12.1f} {:>10.4f}'.format(
+			s['algorithm'], s['difficulty'], s['size'], s['time_limit'], s['solved'], s['runs'],
+			s['cost_mean'], s['cost_median'], s['time_mean']), file=out )
+
+
+def parseArgs( argv ):
+	parser = argparse.ArgumentParser( description='Benchmark the TSP solvers without the GUI.' )
+	parser.add_argument( '--algorithms', nargs='+', default=ALGORITHMS )
+	parser.add_argument( '--difficulties', nargs='+', default=['Hard (Deterministic)'], choices=DIFFICULTIES )
+	parser.add_argument( '--sizes', nargs='+', type=int, default=[10, 15] )
+	parser.add_argument( '--seeds', nargs='+', type=int, default=[20] )
+	parser.add_argument( '--time-limits', nargs='+', type=float, default=[60.0] )
+	parser.add_argument( '--generator-version', type=int, choices=[Scenario.LEGACY_GENERATOR_VERSION, Scenario.GENERATOR_VERSION],
+						 help='Hard mode edge thinning version (default: original for Hard (Deterministic), current for Hard)' )
+	parser.add_argument( '--tsplib', nargs='+', metavar='FILE',
+						 help='run on these TSPLIB instances instead of generated scenarios' )
+	parser.add_argument( '--cache', metavar='DIR',
+						 help='reuse scenarios, cost matrices and best tours stored in this directory between runs' )
+	parser.add_argument( '--csv', help='write every run to this CSV file' )
+	parser.add_argument( '--json', help='write every run and the summary to this JSON file' )
+	parser.add_argument( '--quiet', action='store_true', help='do not print each run as it finishes' )
+	return parser.parse_args( argv )
+
+
+def main( argv=None ):
+	args = parseArgs( argv )
+	progress = None
+	if not args.quiet:
+		progress = lambda row: print( '{algorithm} {difficulty} n={size} seed={seed}: cost {cost} in {time:.4f}s'.format(**row) )
+	if args.tsplib:
+		rows = []
+		for path, time_limit, algorithm in itertools.product( args.tsplib, args.time_limits, args.algorithms ):
+			rows.append( runFile(algorithm, path, time_limit) )
+			if progress:
+				progress( rows[-1] )
+	else:
+		cache = TSPCache( args.cache ) if args.cache else None
+		rows = runGrid( args.algorithms, args.difficulties, args.sizes, args.seeds, args.time_limits, progress,
+						args.generator_version, cache )
+	summary = summarize( rows )
+	if args.csv:
+		writeCsv( rows, args.csv )
+	if args.json:
+		writeJson( rows, summary, args.json )
+	printSummary( summary )
+	return rows, summary
+
+
+if __name__ == '__main__':
+	main()
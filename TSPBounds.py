@@ -0,0 +1,84 @@
+import numpy as np
+
+"""
+    Lower bounds for branch and bound. A bound reduces a state's cost matrix in place and adds the amount it took out
+    to the state's bestCost, so that bestCost plus the matrix entries of any completion of the path is still exactly
+    the completion's cost. Every bound has a reduce(state) method returning that amount; TSPState.reduceMatrix and
+    TSPState.expand take one, and branchAndBound takes one per run.
+"""
+
+"""
+    The classic reduced cost matrix bound: subtract each row's minimum, then each column's minimum.
+    O(n^2)
+"""
+class ReductionBound:
+    def reduce(self, state):
+        return state.reduceMatrixRows() + state.reduceMatrixCols()
+
+"""
+    Lagrangian assignment bound for the asymmetric problem. Any completion of a path leaves every uncovered row once and
+    enters every uncovered column once, i.e. it is an assignment between them, so the assignment problem on the reduced
+    matrix is a lower bound. Relaxing the column constraints with multipliers v gives
+        L(v) = sum_i min_j (c[i][j] - v[j]) + sum_j v[j]
+    which subgradient steps (raise v for columns no row picked, lower it for columns picked more than once) push up
+    towards the assignment optimum. The best multipliers found are applied as a matrix reduction c - u - v with
+    u[i] = min_j (c[i][j] - v[j]), which keeps the matrix non-negative. Steps are integers, so the matrix and bound stay
+    integral and exact. Starts from the row/column reduction, so it is never weaker.
+    O(iterations * n^2)
+"""
+class LagrangianBound:
+    def __init__(self, iterations=10):
+        self.iterations = iterations
+
+    def reduce(self, state):
+        reduction = ReductionBound().reduce(state)
+        if state.bestCost == np.inf:
+            return reduction
+        matrix = state.costMatrix
+        finite = np.isfinite(matrix)
+        rows = np.flatnonzero(finite.any(axis=1))
+        cols = np.flatnonzero(finite.any(axis=0))
+        if len(rows) != len(cols):                                  # some uncovered city can no longer be left or entered
+            state.bestCost = np.inf
+            return np.inf
+        if len(rows) < 2:
+            return reduction
+
+        block = matrix[np.ix_(rows, cols)].astype(np.float64)
+        gain, u, v = self.optimize(block)
+        if gain > 0:
+            matrix[np.ix_(rows, cols)] = block - u[:, np.newaxis] - v[np.newaxis, :]
+            state.bestCost += gain
+            reduction += gain
+        return reduction
+
+    """
+        Subgradient ascent on the column multipliers of a square block whose rows all have a zero.
+        Returns the best gain L(v) and the u, v that achieve it.
+    """
+    def optimize(self, block):
+        k = len(block)
+        v = np.zeros(k)
+        best, bestU, bestV = 0.0, np.zeros(k), v
+        secondMins = np.partition(block, 1, axis=1)[:, 1]
+        secondMins = secondMins[np.isfinite(secondMins)]
+        step = max(1.0, np.floor(np.median(secondMins) / 2)) if len(secondMins) else 1.0
+        stalled = 0
+        for i in range(self.iterations):
+            reduced = block - v
+            picks = reduced.argmin(axis=1)
+            u = reduced[np.arange(k), picks]
+            value = u.sum() + v.sum()
+            if value > best:
+                best, bestU, bestV = value, u, v.copy()
+                stalled = 0
+            else:
+                stalled += 1
+                if stalled >= 3:
+                    step = max(1.0, np.floor(step / 2))
+                    stalled = 0
+            subgradient = 1 - np.bincount(picks, minlength=k)
+            if not subgradient.any():                               # the row minimums already form an assignment
+                break
+            v = v + step * subgradient
+        return float(best), bestU, bestV
@@ -0,0 +1,282 @@
+#!/usr/bin/python3
+
+import mmap
+import time
+import numpy as np
+import multiprocessing
+from TSPState import TSPState
+from TSPFrontier import TSPFrontier
+from TSPBounds import ReductionBound
+from TSPInstrumentation import TSPInstrumentation
+
+PROGRESS_INTERVAL = 0.25													# seconds between onProgress calls
+
+
+''' <summary>
+	The branch-and-bound search loop, shared by TSPSolver.branchAndBound and the
+	parallel workers.  It works on city indices and the scenario cost matrix only, so
+	it can run in a separate process.  sharedBound is an optional multiprocessing
+	Value holding the best tour cost known to any process; it is read on every pop to
+	prune with, and lowered whenever this search finds a better tour.  lowerBound is the
+	TSPBounds bound used to reduce new states (None for the row/column reduction).  With
+	deltas, children are expanded lazily (see TSPState.expand) so that only the states
+	actually popped pay for a full cost matrix; pruned children never get one.
+	onImprove(path, cost, states, bound) is called with every better tour found and
+	the lowest bound of any state still open (the frontier's, a dive's next state
+	and, for a beam, the children it dropped), a lower bound on every tour, and
+	onProgress(stats) every PROGRESS_INTERVAL seconds with the best 'cost', current
+	'queue' size and the 'max', 'total' and 'pruned' counts so far, and onBound(bound)
+	with that lower bound every PROGRESS_INTERVAL seconds and, if the policy orders by
+	bound, whenever it rises; if any returns True the search stops.  instrument is an optional TSPInstrumentation that times
+	expansion, reduction (part of expansion with deltas), heap push/pop and leaf checks,
+	counts why states were pruned and samples the queue size.  policy is the
+	TSPPolicies policy the frontier was built with; its dives and width change which
+	children are queued.
+	</summary>
+	<returns>dictionary with the best tour 'cost' and 'path' found by this search (the
+	bssfCost/bssfPath passed in if nothing better was found), 'count' of improved tours
+	and the 'max' frontier size, 'total' states created and 'pruned' states, and the
+	lower 'bound' when it stopped, which is the best cost once the tree is exhausted.</returns>
+'''
+
+def search( frontier, costMatrix, bssfCost, bssfPath, deadline, sharedBound=None, lowerBound=None, deltas=False,
+			onImprove=None, onProgress=None, instrument=None, policy=None, onBound=None ):
+	ncities = len(costMatrix)
+	byBound = policy is not None and policy.byBound
+	dives = policy is not None and policy.dives
+	width = policy.width if policy is not None else None
+	nextState = None
+	push, pop, expand, leafCost = frontier.push, frontier.pop, TSPState.expand, tourCost
+	if instrument is not None:
+		push, pop = instrument.timed('push', push), instrument.timed('pop', pop)
+		expand, leafCost = instrument.timed('expand', expand), instrument.timed('leaf', leafCost)
+		if not deltas:
+			lowerBound = instrument.timedBound('reduce', lowerBound if lowerBound is not None else ReductionBound())
+	count = 0
+	maxHeapSize = len(frontier)
+	totalStates = 0
+	prunedStates = 0
+	limit = bssfCost
+	dropped = np.inf															# lowest bound of the children a beam dropped
+	floor = -np.inf																# the bound onBound was last called with
+	def liveBound():															# no tour is cheaper than this or an open state's bound
+		return min(frontier.lowerBound(), dropped, limit, nextState.bestCost if nextState is not None else np.inf)
+	nextProgress = time.time() + PROGRESS_INTERVAL
+	while nextState is not None or len(frontier) > 0:							# searches state while there are potentially better paths, worst case O(n!), but approximates to O(n^k), where k = total states - pruned states
+		now = time.time()
+		if now >= deadline:
+			break
+		if now >= nextProgress:
+			nextProgress = now + PROGRESS_INTERVAL
+			if onProgress is not None and onProgress({'cost': limit, 'queue': len(frontier), 'max': maxHeapSize,
+													  'total': totalStates, 'pruned': prunedStates}):
+				break
+			if onBound is not None and onBound(liveBound()):
+				break
+		if onBound is not None and byBound:										# best first: the bound rises as states are popped
+			bound = liveBound()
+			if bound > floor:
+				floor = bound
+				if onBound(bound):
+					break
+		if len(frontier) > maxHeapSize:											# if current heapsize is greater than max size so far, set max size
+			maxHeapSize = len(frontier)											# so far to current heap size
+		if sharedBound is not None and sharedBound.value < limit:				# another process found a better tour, prune against it
+			limit = sharedBound.value
+		if instrument is not None:
+			instrument.sample(len(frontier), limit)
+
+		if nextState is not None:												# diving: expand the cheapest child of the last state next
+			currentState, nextState = nextState, None
+		else:
+			currentState = pop()												# pop best potential solution off queue
+		if currentState.bestCost < limit:										# if the state cost is potentially better than current cost, continue
+			if currentState.len() == ncities:									# if every city is in the path, verify that the path is a cycle
+				cost = leafCost(costMatrix, currentState.path)					# the reduced bound already includes the closing edge, so use the tour's own cost
+				if instrument is not None and cost >= limit:
+					instrument.count('pruned.leaf')
+				if cost < limit:												# if state path is a cycle, set best cost and best path to state path and cost
+					bssfPath = [int(city) for city in currentState.path]
+					bssfCost = cost
+					limit = bssfCost
+					count += 1
+					if sharedBound is not None:
+						with sharedBound.get_lock():
+							if bssfCost < sharedBound.value:
+								sharedBound.value = bssfCost
+					if onImprove is not None and onImprove(bssfPath, bssfCost, totalStates, liveBound()):
+						break
+			else:
+				children = []
+				for city in range(ncities):
+					if not currentState.inPath(city):							# visit every city that has not been visited by the current path
+						totalStates += 1
+						newState = expand(currentState, city, lowerBound, deltas)
+						if newState.bestCost < limit:							# if state is potentially better than current best, push onto heap, else, prune state
+							children.append(newState)
+						else:
+							prunedStates += 1
+							if instrument is not None:
+								instrument.count('pruned.infeasible' if newState.bestCost == np.inf else 'pruned.bound')
+				if (width is not None and len(children) > width) or (dives and children):
+					children.sort(key=lambda state: state.bestCost)
+					if width is not None and len(children) > width:			# beam: drop all but the cheapest children
+						prunedStates += len(children) - width
+						dropped = min(dropped, children[width].bestCost)
+						if instrument is not None:
+							instrument.count('pruned.beam', len(children) - width)
+						del children[width:]
+					if dives:
+						nextState = children.pop(0)
+				for newState in children:
+					push(newState)
+		else:																	# if state cost is worse than best cost, prune state
+			prunedStates += 1
+			if instrument is not None:
+				instrument.count('pruned.popped')
+
+	return {'cost': bssfCost, 'path': bssfPath, 'count': count, 'max': maxHeapSize,
+			'total': totalStates, 'pruned': prunedStates + len(frontier) + (nextState is not None), 'bound': liveBound()}
+
+
+def tourCost( costMatrix, path ):
+	indices = np.asarray(path)
+	cost = costMatrix[indices, np.roll(indices, -1)].sum()
+	return cost if cost == np.inf else int(cost)
+
+
+
+''' <summary>
+	Splits the search tree below the root into at least ntasks independent subtrees by
+	expanding it breadth first, a whole level at a time.  States that cannot beat
+	bssfCost are pruned on the way.
+	</summary>
+	<returns>the list of subtree root states, the number of states created and the
+	number pruned while splitting</returns>
+'''
+
+def split( rootState, costMatrix, bssfCost, ntasks, lowerBound=None, deltas=False ):
+	ncities = len(costMatrix)
+	level = [rootState]
+	totalStates = 0
+	prunedStates = 0
+	while 0 < len(level) < ntasks and level[0].len() < ncities - 2:
+		nextLevel = []
+		for state in level:
+			for city in range(ncities):
+				if not state.inPath(city):
+					totalStates += 1
+					newState = state.expand(city, lowerBound, deltas)
+					if newState.bestCost < bssfCost:
+						nextLevel.append(newState)
+					else:
+						prunedStates += 1
+		level = nextLevel
+	for state in level:
+		state.materialize()													# subtree roots are sent to workers, don't ship their parents' matrices
+	return level, totalStates, prunedStates
+
+
+
+_workerMatrix = None
+_workerBound = None
+
+def _initWorker( costMatrix, sharedBound ):
+	global _workerMatrix, _workerBound
+	if isinstance( costMatrix, tuple ):									# a mapped file, see _shareable
+		filename, offset, shape, dtype = costMatrix
+		costMatrix = np.memmap( filename, dtype=dtype, mode='r', offset=offset, shape=shape )
+	_workerMatrix = costMatrix
+	_workerBound = sharedBound
+
+''' <summary>
+	What the workers get as the cost matrix: a cost matrix memory-mapped from a file
+	(Scenario.load) is sent as its location so that every worker maps the same pages
+	instead of receiving a copy.
+	</summary>
+'''
+def _shareable( costMatrix ):
+	if isinstance( costMatrix, np.memmap ) and isinstance( costMatrix.base, mmap.mmap ) and costMatrix.filename:
+		return (costMatrix.filename, costMatrix.offset, costMatrix.shape, costMatrix.dtype.str)
+	return costMatrix
+
+def _searchSubtree( task ):
+	state, bssfCost, deadline, max_states, max_memory, lowerBound, deltas, instrumented, sampleInterval, policy = task
+	instrument = TSPInstrumentation(sampleInterval) if instrumented else None
+	frontier = TSPFrontier(max_states, max_memory, policy)
+	frontier.push(state)
+	stats = search(frontier, _workerMatrix, min(bssfCost, _workerBound.value), None, deadline, _workerBound, lowerBound, deltas,
+				   instrument=instrument, policy=policy)
+	stats['spilled'] = frontier.spilled
+	stats['instrument'] = instrument.report() if instrument is not None else None
+	stats['root'] = state.bestCost
+	frontier.close()
+	return stats
+
+
+
+''' <summary>
+	Runs the search over a multiprocessing pool.  The tree is split into about
+	four subtrees per worker so that workers which finish early pick up more work, and
+	every worker prunes against the best cost found by any of them through a shared
+	double.  max_states / max_memory bound each worker's own frontier.  The workers
+	cannot call back into this process, so onImprove is called as finished subtrees
+	bring back better tours, with the lowest root bound of the subtrees not yet
+	finished (or the bound a finished one stopped at) as the bound, and onProgress and
+	onBound every PROGRESS_INTERVAL seconds with the best cost any worker has found,
+	the number of subtrees still queued and the merged counts of the finished ones, and
+	with that bound; if any returns True the pool is terminated.  Each
+	worker instruments its own subtrees if instrument is given, and their reports are
+	merged into it.  Every worker searches its subtrees with policy.
+	</summary>
+	<returns>the same dictionary as search, with the statistics of all subtrees
+	merged: 'total' and 'pruned' are summed, 'max' is the largest queue of any single
+	search, 'spilled' is summed over the workers and 'bound' is the lowest.</returns>
+'''
+
+def parallelSearch( rootState, costMatrix, bssfCost, bssfPath, deadline, workers,
+					max_states=None, max_memory=None, lowerBound=None, deltas=False, onImprove=None, onProgress=None,
+					instrument=None, policy=None, onBound=None ):
+	subtrees, totalStates, prunedStates = split(rootState, costMatrix, bssfCost, 4*workers, lowerBound, deltas)
+	results = {'cost': bssfCost, 'path': bssfPath, 'count': 0, 'max': len(subtrees),
+			   'total': totalStates, 'pruned': prunedStates, 'spilled': 0}
+
+	sharedBound = multiprocessing.Value('d', float(bssfCost))
+	instrumented = instrument is not None
+	sampleInterval = instrument.sampleInterval if instrumented else None
+	tasks = [(state, bssfCost, deadline, max_states, max_memory, lowerBound, deltas, instrumented, sampleInterval, policy)
+			 for state in subtrees]
+	with multiprocessing.Pool(workers, initializer=_initWorker, initargs=(_shareable(costMatrix), sharedBound)) as pool:
+		pending = pool.imap_unordered(_searchSubtree, tasks)
+		remaining = len(tasks)
+		openBounds = sorted(state.bestCost for state in subtrees)		# root bounds of the subtrees not finished
+		finished = np.inf													# lowest bound the finished subtrees stopped at
+		liveBound = lambda: min(openBounds[:1] + [finished, results['cost']])
+		while remaining > 0:
+			try:
+				stats = pending.next(PROGRESS_INTERVAL)
+			except multiprocessing.TimeoutError:
+				if onProgress is not None and onProgress({'cost': sharedBound.value, 'queue': remaining,
+														  'max': results['max'], 'total': results['total'],
+														  'pruned': results['pruned']}):
+					break
+				if onBound is not None and onBound(liveBound()):
+					break
+				continue
+			remaining -= 1
+			openBounds.remove(stats['root'])
+			finished = min(finished, stats['bound'])
+			results['count'] += stats['count']
+			results['max'] = max(results['max'], stats['max'])
+			results['total'] += stats['total']
+			results['pruned'] += stats['pruned']
+			results['spilled'] += stats['spilled']
+			if instrumented:
+				instrument.merge(stats['instrument'])
+			if stats['path'] is not None and stats['cost'] < results['cost']:
+				results['cost'] = stats['cost']
+				results['path'] = stats['path']
+				if onImprove is not None and onImprove(results['path'], results['cost'], results['total'], liveBound()):
+					break
+	results['bound'] = liveBound()
+	return results
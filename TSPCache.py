@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from collections import OrderedDict
+from TSPClasses import Scenario, newScenario
+
+
+
+''' <summary>
+	Cache of generated scenarios, their cost matrices and the best tour each algorithm
+	has found on them, keyed by the settings that generate them: (size, seed,
+	difficulty, generator_version), see key().  The last capacity scenarios stay in
+	memory; with a directory, every scenario is also written there with its cost
+	matrix (Scenario.save, memory-mapped on load) together with its best tours, so
+	later processes skip generation and matrix construction.
+
+	Scenarios are built with TSPClasses.newScenario (or build), which seeds both
+	random generators, so a key always gives the same instance.  The GUI's "Hard" mode
+	draws a new graph every time and should not go through the cache.
+	</summary>
+'''
+
+class TSPCache:
+	CAPACITY = 8
+
+	def __init__( self, directory=None, capacity=CAPACITY, build=None ):
+		self.directory = directory
+		self.capacity = capacity
+		self._build = build if build is not None else newScenario
+		self._scenarios = OrderedDict()
+		self._tours = {}
+		self.hits = 0
+		self.diskHits = 0
+		self.misses = 0
+		if directory is not None:
+			os.makedirs( directory, exist_ok=True )
+
+	''' <summary>
+		generator_version None is resolved to the version Scenario uses for the
+		difficulty, so that entries written before Scenario.GENERATOR_VERSION changes
+		are not served for the new generator.
+		</summary>
+	'''
+	@staticmethod
+	def key( size, seed, difficulty, generator_version=None ):
+		return (int(size), int(seed), difficulty, Scenario.generatorVersion(difficulty, generator_version))
+
+	def _path( self, key, name ):
+		digest = hashlib.sha1( json.dumps(list(key)).encode() ).hexdigest()[:16]
+		return os.path.join( self.directory, digest, name )
+
+	''' <summary>
+		The scenario for key: from memory, else from the directory, else generated
+		(and stored).
+		</summary>
+	'''
+	def scenario( self, key ):
+		if key in self._scenarios:
+			self.hits += 1
+			self._scenarios.move_to_end( key )
+			return self._scenarios[key]
+		scenario = self._load( key )
+		if scenario is not None:
+			self.diskHits += 1
+		else:
+			self.misses += 1
+			scenario = self._build( *key )
+			self._store( key, scenario )
+		self._scenarios[key] = scenario
+		while len(self._scenarios) > self.capacity:
+			self._scenarios.popitem( last=False )
+		return scenario
+
+	def _load( self, key ):
+		if self.directory is None or not os.path.exists( self._path(key, 'scenario.tsp') ):
+			return None
+		return Scenario.load( self._path(key, 'scenario.tsp') )
+
+	def _store( self, key, scenario ):
+		if self.directory is None:
+			return
+		os.makedirs( os.path.dirname(self._path(key, '')), exist_ok=True )
+		_atomicWrite( self._path(key, 'scenario.tsp'), lambda path: scenario.save(path, cost_matrix=True) )
+
+	def tours( self, key ):
+		if key not in self._tours:
+			self._tours[key] = {}
+			if self.directory is not None and os.path.exists( self._path(key, 'tours.json') ):
+				with open( self._path(key, 'tours.json') ) as file:
+					self._tours[key] = {algorithm: (tour['cost'], tour['route'])
+										for algorithm, tour in json.load(file).items()}
+		return self._tours[key]
+
+	''' <summary>
+		The cheapest tour recorded for key by algorithm, or by any algorithm if it is
+		None.
+		</summary>
+		<returns>(cost, route as a list of city indices), or None</returns>
+	'''
+	def bestTour( self, key, algorithm=None ):
+		tours = self.tours( key )
+		if algorithm is not None:
+			return tours.get( algorithm )
+		return min( tours.values(), key=lambda tour: tour[0], default=None )
+
+	''' <summary>
+		Records solution (a TSPSolution) as algorithm's tour for key if it is cheaper
+		than the one recorded.
+		</summary>
+		<returns>True if it was recorded</returns>
+	'''
+	def recordTour( self, key, algorithm, solution ):
+		cost = solution.cost
+		tours = self.tours( key )
+		if cost == np.inf or (algorithm in tours and tours[algorithm][0] <= cost):
+			return False
+		tours[algorithm] = (int(cost), [city._index for city in solution.route])
+		if self.directory is not None:
+			os.makedirs( os.path.dirname(self._path(key, '')), exist_ok=True )
+			data = {algorithm: {'cost': cost, 'route': route} for algorithm, (cost, route) in tours.items()}
+			def write( path ):
+				with open( path, 'w' ) as file:
+					json.dump( data, file )
+			_atomicWrite( self._path(key, 'tours.json'), write )
+		return True
+
+
+''' <summary>
+	Calls write with a temporary file name next to path and renames the file to path,
+	so that readers never see a partly written file.
+	</summary>
+'''
+def _atomicWrite( path, write ):
+	handle, temporary = tempfile.mkstemp( dir=os.path.dirname(path) )
+	os.close( handle )
+	try:
+		write( temporary )
+		os.replace( temporary, path )
+	except BaseException:
+		os.unlink( temporary )
+		raise
@@ -2,6 +2,7 @@
 
 
 import math
+import json
 import numpy as np
 import random
 import time
@@ -14,35 +15,53 @@ class TSPSolution:
 		self.cost = self._costOfRoute()
 		#print( [c._index for c in listOfCities] )
 
+	''' <summary>
+		Looks up every leg of the tour in the scenario's precomputed cost matrix
+		at once instead of calling costTo for each leg.
+		</summary>
+		<returns>the integer cost of the tour, or np.inf if any leg is missing</returns>
+	'''
 	def _costOfRoute( self ):
-		cost = 0
-		#print('cost = ',cost)
-		last = self.route[0]
-		for city in self.route[1:]:
-			#print('cost increasing by {} for leg {} to {}'.format(last.costTo(city),last._name,city._name))
-			cost += last.costTo(city)
-			last = city
-		#print('cost increasing by {} for leg {} to {}'.format(self.route[-1].costTo(self.route[0]),self.route[-1]._name,self.route[0]._name))
-		cost += self.route[-1].costTo( self.route[0] )
-		#print('cost = ',cost)
-		return cost
+		costs = self._legCosts()
+		cost = costs.sum()
+		if cost == np.inf:
+			return np.inf
+		return int(cost)
+
+	def _legCosts( self ):
+		indices = np.array( [city._index for city in self.route] )
+		return self.route[0]._scenario.legCosts( indices )
 
 	def enumerateEdges( self ):
-		elist = []
-		c1 = self.route[0]
-		for c2 in self.route[1:]:
-			dist = c1.costTo( c2 )
-			if dist == np.inf:
-				return None
-			elist.append( (c1, c2, int(math.ceil(dist))) )
-			c1 = c2
-		dist = self.route[-1].costTo( self.route[0] )
-		if dist == np.inf:
+		costs = self._legCosts()
+		if np.isinf(costs).any():
 			return None
-		elist.append( (self.route[-1], self.route[0], int(math.ceil(dist))) )
+		elist = []
+		for i in range(len(self.route)):
+			elist.append( (self.route[i], self.route[(i+1)%len(self.route)], int(costs[i])) )
 		return elist
 
 
+TOUR_BATCH_ENTRIES = 2**22			# city indices gathered per block by tourCosts, bounds the temporaries
+
+def tourCosts( costMatrix, tours ):
+	tours = np.asarray( tours, dtype=np.intp )
+	if tours.ndim == 1:
+		return tourCosts( costMatrix, tours[np.newaxis, :] )
+	ntours, ncities = tours.shape
+	size = costMatrix.shape[1]
+	flat = np.ascontiguousarray( costMatrix, dtype=np.float64 ).ravel()
+	costs = np.empty( ntours )
+	rows = max( 1, TOUR_BATCH_ENTRIES // max(1, ncities) )
+	for start in range( 0, ntours, rows ):
+		block = tours[start:start+rows]
+		legs = block * size
+		legs[:, :-1] += block[:, 1:]
+		legs[:, -1] += block[:, 0]
+		costs[start:start+rows] = flat[legs].sum( axis=1 )
+	return costs
+
+
 def nameForInt( num ):
 	if num == 0:
 		return ''
@@ -61,21 +80,38 @@ def nameForInt( num ):
 class Scenario:
 
 	HARD_MODE_FRACTION_TO_REMOVE = 0.20 # Remove 20% of the edges
+	GENERATOR_VERSION = 2				# see thinEdges
+	LEGACY_GENERATOR_VERSION = 1
+	EXPLICIT = 'Explicit'				# difficulty of scenarios whose costs were given, see fromCostMatrix
+	FILE_MAGIC = b'TSPSCN\x00\x01'		# see save
+	FILE_ALIGNMENT = 4096
 
-	def __init__( self, city_locations, difficulty, rand_seed ):
+	''' <summary>
+		city_locations may be any sequence of points with x() and y() methods (the
+		GUI's QPointF), of (x, y) pairs, or an (n x 2) NumPy array, so scenarios can
+		be built without Qt.  generator_version selects how Hard modes remove edges
+		(see thinEdges); by default "Hard (Deterministic)" keeps the original
+		generator so existing seeds give the same graphs, and "Hard" uses the current
+		one.
+		</summary>
+	'''
+	def __init__( self, city_locations, difficulty, rand_seed, generator_version=None ):
 		self._difficulty = difficulty
+		self._rand_seed = rand_seed
+		self._cost_matrix = None
+		locations = self.coordinates( city_locations )
 
 		if difficulty == "Normal" or difficulty == "Hard":
-			self._cities = [City( pt.x(), pt.y(), \
+			self._cities = [City( x, y, \
 								  random.uniform(0.0,1.0) \
-								) for pt in city_locations]
+								) for x, y in locations]
 		elif difficulty == "Hard (Deterministic)":
 			random.seed( rand_seed )
-			self._cities = [City( pt.x(), pt.y(), \
+			self._cities = [City( x, y, \
 								  random.uniform(0.0,1.0) \
-								) for pt in city_locations]
+								) for x, y in locations]
 		else:
-			self._cities = [City( pt.x(), pt.y() ) for pt in city_locations]
+			self._cities = [City( x, y ) for x, y in locations]
 
 
 		num = 0
@@ -91,13 +127,201 @@ class Scenario:
 
 		#print( self._edge_exists )
 		if difficulty == "Hard":
-			self.thinEdges()
+			self.thinEdges(version=self.generatorVersion(difficulty, generator_version))
 		elif difficulty == "Hard (Deterministic)":
-			self.thinEdges(deterministic=True)
+			self.thinEdges(deterministic=True, version=self.generatorVersion(difficulty, generator_version))
+
+	''' <summary>
+		The generator version a scenario of this difficulty is built with when
+		generator_version is None (see __init__).
+		</summary>
+	'''
+	@classmethod
+	def generatorVersion( cls, difficulty, generator_version=None ):
+		if generator_version is not None:
+			return generator_version
+		return cls.LEGACY_GENERATOR_VERSION if difficulty == "Hard (Deterministic)" else cls.GENERATOR_VERSION
+
+	''' <summary>
+		A scenario with the given costs instead of ones computed from coordinates, e.g.
+		from a TSPLIB file (see TSPLib).  Missing edges are np.inf and self-edges always
+		are.  city_locations only place the cities for display; without them the cities
+		are spread on a circle.
+		</summary>
+	'''
+	@classmethod
+	def fromCostMatrix( cls, cost_matrix, city_locations=None ):
+		matrix = np.array( cost_matrix, dtype=np.float64 )
+		ncities = len(matrix)
+		np.fill_diagonal( matrix, np.inf )
+		matrix.setflags( write=False )
+		if city_locations is None:
+			angles = 2 * np.pi * np.arange( ncities ) / max( ncities, 1 )
+			city_locations = np.column_stack( (np.cos(angles), np.sin(angles)) )
+		locations = np.array( cls.coordinates(city_locations), dtype=float ).reshape(-1, 2)
+		scenario = cls.__new__( cls )
+		scenario._difficulty = cls.EXPLICIT
+		scenario._rand_seed = 0
+		scenario._setCities( locations[:, 0], locations[:, 1], np.zeros(ncities) )
+		scenario._edge_exists = np.isfinite( matrix )
+		scenario._cost_matrix = matrix
+		return scenario
+
+	def _setCities( self, xs, ys, elevations ):
+		self._cities = []
+		for i, (x, y, elevation) in enumerate( zip(list(xs), list(ys), list(elevations)) ):
+			city = City( float(x), float(y), float(elevation) )
+			city.setScenario( self )
+			city.setIndexAndName( i, nameForInt( i+1 ) )
+			self._cities.append( city )
+
+	''' <summary>
+		Pickles leave out the cost matrix, which is rebuilt on first use, unless it
+		was given (fromCostMatrix).
+		</summary>
+	'''
+	def __getstate__( self ):
+		state = self.__dict__.copy()
+		if self._difficulty != self.EXPLICIT:
+			state['_cost_matrix'] = None
+		return state
+
+	''' <summary>
+		Writes the scenario to path in a binary format load can memory-map: FILE_MAGIC,
+		the little-endian uint32 length of a JSON header (difficulty, seed and the
+		offset, dtype and shape of every array), then the arrays, each starting on a
+		FILE_ALIGNMENT boundary: x, y and elevation (float64), the edge mask packed 8
+		edges per byte (np.packbits, row-major), and with cost_matrix the full cost
+		matrix (float64), so that loading skips building it.  Scenarios with given
+		costs (fromCostMatrix) always include it.
+		</summary>
+	'''
+	def save( self, path, cost_matrix=False ):
+		arrays = {
+			'x': np.array( [city._x for city in self._cities], dtype='<f8' ),
+			'y': np.array( [city._y for city in self._cities], dtype='<f8' ),
+			'elevation': np.array( [city._elevation for city in self._cities], dtype='<f8' ),
+			'edges': np.packbits( self._edge_exists, axis=None ),
+		}
+		if cost_matrix or self._difficulty == self.EXPLICIT:
+			arrays['costMatrix'] = np.ascontiguousarray( self.costMatrix, dtype='<f8' )
+		align = lambda offset: -(-offset // self.FILE_ALIGNMENT) * self.FILE_ALIGNMENT
+		start = self.FILE_ALIGNMENT
+		while True:
+			offset, entries = start, {}
+			for name, array in arrays.items():
+				entries[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+				offset = align( offset + array.nbytes )
+			header = json.dumps( {'ncities': len(self._cities), 'difficulty': self._difficulty,
+								  'rand_seed': int(self._rand_seed), 'arrays': entries} ).encode()
+			if len(self.FILE_MAGIC) + 4 + len(header) <= start:
+				break
+			start = align( len(self.FILE_MAGIC) + 4 + len(header) )
+		with open( path, 'wb' ) as file:
+			file.write( self.FILE_MAGIC + len(header).to_bytes(4, 'little') + header )
+			for name, array in arrays.items():
+				file.seek( entries[name]['offset'] )
+				file.write( array.tobytes() )
+			file.truncate( offset )
+
+	''' <summary>
+		Reads a scenario written by save.  With mmap the arrays are memory-mapped
+		read-only instead of read, so a saved cost matrix costs nothing until it is used
+		and every process loading the same file shares its pages (see
+		TSPBranchAndBound.parallelSearch).  The edge mask is unpacked into memory.
+		</summary>
+	'''
+	@classmethod
+	def load( cls, path, mmap=True ):
+		with open( path, 'rb' ) as file:
+			if file.read( len(cls.FILE_MAGIC) ) != cls.FILE_MAGIC:
+				raise ValueError( '{} is not a saved scenario'.format(path) )
+			header = json.loads( file.read(int.from_bytes(file.read(4), 'little')) )
+		def array( name ):
+			entry = header['arrays'][name]
+			if mmap:
+				return np.memmap( path, dtype=entry['dtype'], mode='r', offset=entry['offset'], shape=tuple(entry['shape']) )
+			count = int(np.prod( entry['shape'] ))
+			return np.fromfile( path, dtype=entry['dtype'], count=count, offset=entry['offset'] ).reshape( entry['shape'] )
+
+		ncities = header['ncities']
+		scenario = cls.__new__( cls )
+		scenario._difficulty = header['difficulty']
+		scenario._rand_seed = header['rand_seed']
+		scenario._setCities( array('x').tolist(), array('y').tolist(), array('elevation').tolist() )
+		edges = np.unpackbits( array('edges'), count=ncities*ncities ).astype( bool )
+		scenario._edge_exists = edges.reshape( ncities, ncities )
+		scenario._cost_matrix = None
+		if 'costMatrix' in header['arrays']:
+			scenario._cost_matrix = array( 'costMatrix' )
+			if not mmap:
+				scenario._cost_matrix.setflags( write=False )
+		return scenario
+
+	''' <summary>
+		city_locations (QPointFs, (x, y) pairs or an (n x 2) array, see __init__) as a
+		list of (x, y) float pairs.
+		</summary>
+	'''
+	@staticmethod
+	def coordinates( city_locations ):
+		if isinstance( city_locations, np.ndarray ):
+			return [(float(x), float(y)) for x, y in city_locations.reshape(-1, 2)]
+		return [(pt.x(), pt.y()) if hasattr(pt, 'x') else (float(pt[0]), float(pt[1])) \
+				for pt in city_locations]
 
 	def getCities( self ):
 		return self._cities
 
+	''' <summary>
+		Full asymmetric cost matrix between every pair of cities, built once with
+		NumPy from the city coordinates and elevations.  Entry [i,j] is exactly
+		cities[i].costTo(cities[j]): the ceiling of the scaled distance, or np.inf
+		when the edge does not exist (including self-edges).
+		</summary>
+		<returns>a read-only (ncities x ncities) float64 array</returns>
+	'''
+	@property
+	def costMatrix( self ):
+		if self._cost_matrix is None:
+			self._cost_matrix = self._buildCostMatrix()
+		return self._cost_matrix
+
+	def _buildCostMatrix( self ):
+		xs = np.array( [city._x for city in self._cities], dtype=float )
+		ys = np.array( [city._y for city in self._cities], dtype=float )
+		elevations = np.array( [city._elevation for city in self._cities], dtype=float )
+
+		# Same arithmetic as City.costTo, one row of sources per column of destinations
+		cost = np.sqrt( (xs[np.newaxis,:] - xs[:,np.newaxis])**2 +
+						(ys[np.newaxis,:] - ys[:,np.newaxis])**2 )
+		if not self._difficulty == 'Easy':
+			cost += elevations[np.newaxis,:] - elevations[:,np.newaxis]
+			cost[cost < 0.0] = 0.0
+		cost = np.ceil( cost * City.MAP_SCALE )
+		cost[~self._edge_exists] = np.inf
+
+		cost.setflags( write=False )
+		return cost
+
+	''' <summary>
+		Costs of many tours at once: tours is a (k x n) array of city indices, one
+		tour per row (a single tour may be 1-D), looked up in costMatrix with one
+		gather per block of rows instead of a Python loop per leg.
+		</summary>
+		<returns>float64 array of k tour costs, np.inf for tours using a missing edge</returns>
+	'''
+	def tourCosts( self, tours ):
+		return tourCosts( self.costMatrix, tours )
+
+	''' <summary>
+		Costs of the legs of one tour, given as an array of city indices, in order
+		(the last leg returns to the first city).
+		</summary>
+	'''
+	def legCosts( self, indices ):
+		return self.costMatrix[indices, np.roll(indices, -1)]
+
 
 	def randperm( self, n ):				#isn't there a numpy function that does this and even gets called in Solver?
 		perm = np.arange(n)
@@ -108,12 +332,40 @@ class Scenario:
 			perm[randind] = save
 		return perm
 
-	def thinEdges( self, deterministic=False ):
+	''' <summary>
+		Removes HARD_MODE_FRACTION_TO_REMOVE of the edges, never those of one random
+		tour kept aside so that a tour always exists.  Version 2 picks the removed
+		edges directly as a uniform random subset of the deletable ones, which is the
+		distribution the version 1 rejection loop (random source/destination draws
+		until enough edges are removed) samples from, in a few vectorized steps.  Its
+		"Hard (Deterministic)" graphs are drawn from a NumPy generator seeded with
+		rand_seed, so they are reproducible too, but differ from version 1's.  Version
+		1 replays the original draws exactly, with the membership checks moved off
+		NumPy scalars.
+		</summary>
+	'''
+	def thinEdges( self, deterministic=False, version=GENERATOR_VERSION ):
 		ncities = len(self._cities)
 		edge_count = ncities*(ncities-1) # can't have self-edge
-		num_to_remove = np.floor(self.HARD_MODE_FRACTION_TO_REMOVE*edge_count)
+		num_to_remove = int(np.floor(self.HARD_MODE_FRACTION_TO_REMOVE*edge_count))
+		if version == self.LEGACY_GENERATOR_VERSION:
+			self._thinEdgesLegacy( deterministic, num_to_remove )
+			return
+		if version != self.GENERATOR_VERSION:
+			raise ValueError( 'Unknown scenario generator version {}'.format(version) )
+
+		rng = np.random.RandomState( self._rand_seed ) if deterministic else np.random
+		can_delete	= self._edge_exists.copy()
+
+		# Set aside a route to ensure at least one tour exists
+		route_keep = rng.permutation( ncities )
+		can_delete[route_keep, np.roll(route_keep, -1)] = False
+
+		removed = rng.choice( np.flatnonzero(can_delete), num_to_remove, replace=False )
+		self._edge_exists.flat[removed] = False
 
-		#edge_exists = ( np.ones((ncities,ncities)) - np.diag( np.ones((ncities)) ) ) > 0
+	def _thinEdgesLegacy( self, deterministic, num_to_remove ):
+		ncities = len(self._cities)
 		can_delete	= self._edge_exists.copy()
 
 		# Set aside a route to ensure at least one tour exists
@@ -123,7 +375,10 @@ class Scenario:
 		for i in range(ncities):
 			can_delete[route_keep[i],route_keep[(i+1)%ncities]] = False
 
-		# Now remove edges until 
+		# Now remove edges until enough are gone; an edge is removable while it
+		# exists and is not on the kept route, tracked in one flat bytearray
+		deletable = bytearray( (self._edge_exists & can_delete).ravel() )
+		removed = []
 		while num_to_remove > 0:
 			if deterministic:
 				src = random.randint(0,ncities-1)
@@ -131,9 +386,12 @@ class Scenario:
 			else:
 				src = np.random.randint(ncities)
 				dst = np.random.randint(ncities)
-			if self._edge_exists[src,dst] and can_delete[src,dst]:
-				self._edge_exists[src,dst] = False
+			edge = src*ncities + dst
+			if deletable[edge]:
+				deletable[edge] = 0
+				removed.append( edge )
 				num_to_remove -= 1
+		self._edge_exists.flat[removed] = False
 
 		#print( self._edge_exists )
 
@@ -170,6 +428,10 @@ class City:
 
 		assert( type(other_city) == City )
 
+		# Given costs (e.g. from TSPLIB) do not come from the coordinates
+		if self._scenario._difficulty == Scenario.EXPLICIT:
+			return self._scenario.costMatrix[self._index, other_city._index]
+
 		# In hard mode, remove edges; this slows down the calculation...
 		# Use this in all difficulties, it ensures INF for self-edge
 		if not self._scenario._edge_exists[self._index, other_city._index]:
@@ -190,3 +452,36 @@ class City:
 
 		return int(math.ceil(cost * self.MAP_SCALE))
 
+
+
+DATA_RANGE = { 'x':[-1.5,1.5], 'y':[-1.0,1.0] }			# where cities are placed, and what the GUI displays
+
+''' <summary>
+	Cities for the given size and seed as (x, y) pairs spread uniformly over
+	data_range, the area Proj5GUI displays.
+	</summary>
+'''
+def newPoints( size, seed, data_range=DATA_RANGE ):
+	random.seed( seed )
+	xr = data_range['x']
+	yr = data_range['y']
+	ptlist = []
+	while len(ptlist) < size:
+		x = random.uniform(0.0,1.0)
+		y = random.uniform(0.0,1.0)
+		ptlist.append( (xr[0] + (xr[1]-xr[0])*x, yr[0] + (yr[1]-yr[0])*y) )
+	return ptlist
+
+
+''' <summary>
+	Builds the scenario of these settings, as Proj5GUI, TSPBenchmark and TSPCache
+	do.  NumPy's global generator is seeded too, so "Hard" mode (which thins edges
+	with np.random) is also reproducible between runs.  generator_version is passed
+	on to Scenario (None for its defaults).
+	</summary>
+'''
+def newScenario( size, seed, difficulty, generator_version=None ):
+	points = newPoints( size, seed )
+	np.random.seed( seed )
+	return Scenario( city_locations=points, difficulty=difficulty, rand_seed=seed,
+					 generator_version=generator_version )
@@ -0,0 +1,114 @@
+import math
+import pickle
+import tempfile
+import itertools
+from heapq import heappop, heappush
+from TSPPolicies import DepthFirst
+
+"""
+    The branch and bound priority queue. Without limits it is just a heapq heap. Given max_states (or max_memory in bytes,
+    converted to a state count from the size of the first state's cost matrix), it keeps at most that many states in memory:
+    when the heap overflows, the lowest priority half is pickled to a temporary file, and batches are read back, most
+    recently spilled first, whenever the in-memory heap drains. Lazily expanded states are detached from their parent's
+    matrix before they are spilled (see TSPState.detach), with the first state pushed that has its own matrix as their
+    root. States are ordered by the key of a TSPPolicies policy (depth-first by default); heap entries are (key...,
+    sequence number, state) tuples, so states are never compared and equal keys leave in the order they were pushed.
+"""
+class TSPFrontier:
+    SPILL_FRACTION = 0.5
+
+    def __init__(self, max_states=None, max_memory=None, policy=None):
+        self._heap = []
+        policy = policy if policy is not None else DepthFirst()
+        self._key = policy.key
+        self._byBound = policy.byBound
+        self._sequence = itertools.count()
+        self._max_states = max_states
+        self._max_memory = max_memory
+        self._file = None
+        self._root = None
+        self._batches = []
+        self._spilledCount = 0
+        self.spilled = 0
+        self.reloaded = 0
+
+    def __len__(self):
+        return len(self._heap) + self._spilledCount
+
+    """
+        Pushes a state, spilling the worst states to disk if the heap is over its limit
+        O(log n), or O(n log n) when a spill happens
+    """
+    def push(self, state):
+        if self._root is None and state.delta is None and state.costMatrix is not None:
+            self._root = state
+        heappush(self._heap, self._key(state) + (next(self._sequence), state))
+        limit = self._limit(state)
+        if limit is not None and len(self._heap) > limit:
+            self._spillWorst()
+
+    """
+        Pops the best state in memory, first reloading a spilled batch if the heap is empty
+        O(log n), or O(k) to reload a batch of k states
+    """
+    def pop(self):
+        if len(self._heap) == 0 and len(self._batches) > 0:
+            self._reload()
+        return heappop(self._heap)[-1]
+
+    """
+        The lowest bound (bestCost) of any state in the frontier, in memory or spilled, or inf if it is empty
+        O(n) over the states in memory, or O(1) plus the spilled batches if the policy orders by bound
+    """
+    def lowerBound(self):
+        if self._byBound:
+            bound = self._heap[0][-1].bestCost if self._heap else math.inf
+        else:
+            bound = min((entry[-1].bestCost for entry in self._heap), default=math.inf)
+        return min([bound] + [batchBound for offset, count, batchBound in self._batches])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._batches = []
+        self._spilledCount = 0
+
+    def _limit(self, state):
+        if self._max_states is None and self._max_memory is not None and state.costMatrix is not None:
+            self._max_states = max(2, self._max_memory // max(1, state.costMatrix.nbytes))
+        return self._max_states
+
+    """
+        Sorts the heap (a sorted list is still a valid heap), keeps the best part in memory and appends the rest to
+        the spill file as a single pickled batch
+    """
+    def _spillWorst(self):
+        self._heap.sort()
+        keep = max(1, int(len(self._heap) * (1 - self.SPILL_FRACTION)))
+        batch = self._heap[keep:]
+        del self._heap[keep:]
+        if self._root is not None:
+            for entry in batch:
+                entry[-1].detach(self._root)
+
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+        self._file.seek(0, 2)
+        offset = self._file.tell()
+        pickle.dump(batch, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._batches.append((offset, len(batch), min(entry[-1].bestCost for entry in batch)))
+        self._spilledCount += len(batch)
+        self.spilled += len(batch)
+
+    """
+        Reads back the most recently spilled batch and truncates it from the file so disk use shrinks as the search
+        drains. The batch was stored sorted, so it is already a valid heap.
+    """
+    def _reload(self):
+        offset, count, batchBound = self._batches.pop()
+        self._file.seek(offset)
+        self._heap = pickle.load(self._file)
+        self._file.truncate(offset)
+        self._spilledCount -= count
+        self.reloaded += count
@@ -0,0 +1,60 @@
+import unittest
+import random
+import numpy as np
+from TSPState import *
+from TSPFrontier import *
+import TSPPolicies
+
+class TestTSPFrontier(unittest.TestCase):
+    def setUp(self):
+        random.seed(4)
+        self.states = []
+        for i in range(200):
+            state = TSPState(np.zeros(random.randint(1, 6), dtype=int), random.randint(1, 50), np.zeros((4, 4)))
+            self.states.append(state)
+
+    def popAll(self, frontier):
+        popped = []
+        while len(frontier) > 0:
+            popped.append(frontier.pop())
+        return popped
+
+    def test_unbounded_is_a_heap(self):
+        frontier = TSPFrontier()
+        for state in self.states:
+            frontier.push(state)
+        self.assertEqual(len(frontier), len(self.states))
+        popped = self.popAll(frontier)
+        for i in range(len(popped) - 1):
+            self.assertFalse(popped[i + 1] < popped[i])
+        self.assertEqual(frontier.spilled, 0)
+
+    def test_policy_order(self):
+        frontier = TSPFrontier(policy=TSPPolicies.BestFirst())
+        for state in self.states:
+            frontier.push(state)
+        popped = self.popAll(frontier)
+        keys = [(s.bestCost, -s.len()) for s in popped]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_spill_keeps_every_state(self):
+        frontier = TSPFrontier(max_states=16)
+        for state in self.states:
+            frontier.push(state)
+            self.assertLessEqual(len(frontier._heap), 16)
+        self.assertEqual(len(frontier), len(self.states))
+        self.assertGreater(frontier.spilled, 0)
+
+        popped = self.popAll(frontier)
+        self.assertEqual(sorted((s.len(), s.bestCost) for s in popped),
+            sorted((s.len(), s.bestCost) for s in self.states))
+        self.assertEqual(frontier.reloaded, frontier.spilled)
+        frontier.close()
+
+    def test_max_memory(self):
+        frontier = TSPFrontier(max_memory=10 * self.states[0].costMatrix.nbytes)
+        for state in self.states:
+            frontier.push(state)
+            self.assertLessEqual(len(frontier._heap), 10)
+        self.assertEqual(len(self.popAll(frontier)), len(self.states))
+        frontier.close()
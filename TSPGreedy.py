@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+
+import time
+import numpy as np
+import multiprocessing
+
+PROGRESS_INTERVAL = 0.25										# seconds between onProgress calls
+
+
+''' <summary>
+	Nearest neighbor tour construction.  Every city's destinations are sorted by cost
+	once up front, so building a tour is a walk down each city's list skipping cities
+	already in the route (a visited mask lookup) instead of a scan of every city.
+	Missing edges sort last as np.inf, so a walk stops as soon as it reaches one.
+	</summary>
+'''
+
+def neighborLists( costMatrix ):
+	order = np.argsort( costMatrix, axis=1, kind='stable' )
+	return [ row[:count].tolist() for row, count in zip(order, np.isfinite(costMatrix).sum(axis=1)) ]
+
+
+''' <summary>
+	Builds the greedy tour starting at one city.
+	</summary>
+	<returns>(cost, route as a list of city indices), or (np.inf, None) if the walk
+	reaches a city with no edge to an unvisited city or cannot close the cycle</returns>
+'''
+
+def greedyTour( start, costs, neighbors ):
+	ncities = len(neighbors)
+	visited = bytearray(ncities)
+	visited[start] = 1
+	route = [start]
+	cost = 0
+	current = start
+	while len(route) < ncities:
+		next = None
+		for city in neighbors[current]:
+			if not visited[city]:
+				next = city
+				break
+		if next is None:
+			return np.inf, None
+		cost += costs[current][next]
+		visited[next] = 1
+		route.append(next)
+		current = next
+	closing = costs[current][start]
+	if closing == np.inf:
+		return np.inf, None
+	return cost + closing, route
+
+
+''' <summary>
+	Runs greedyTour from each start city until the deadline, but past it until one
+	start gives a tour, or until onProgress(tours), called every PROGRESS_INTERVAL
+	seconds with the tours so far, returns True.
+	</summary>
+	<returns>a list of (start, cost, route) for the starts that were tried</returns>
+'''
+
+def greedyTours( starts, costs, neighbors, deadline, onProgress=None ):
+	tours = []
+	found = False
+	nextProgress = time.time() + PROGRESS_INTERVAL
+	for start in starts:
+		now = time.time()
+		if found and now >= deadline:
+			break
+		if onProgress is not None and now >= nextProgress:
+			nextProgress = now + PROGRESS_INTERVAL
+			if onProgress( tours ):
+				break
+		cost, route = greedyTour( start, costs, neighbors )
+		tours.append( (start, cost, route) )
+		found = found or route is not None
+	return tours
+
+
+
+_workerCosts = None
+_workerNeighbors = None
+
+def _initWorker( costs, neighbors ):
+	global _workerCosts, _workerNeighbors
+	_workerCosts = costs
+	_workerNeighbors = neighbors
+
+def _greedyChunk( task ):
+	starts, deadline = task
+	return greedyTours( starts, _workerCosts, _workerNeighbors, deadline )
+
+
+''' <summary>
+	Tries every start city, optionally spread over a process pool, and keeps the
+	cheapest tour.  onProgress is as for greedyTours; with a pool the starts go out in
+	CHUNKS_PER_WORKER chunks per worker and it is checked as each chunk comes back.
+	</summary>
+	<returns>(best cost, best route or None, list of (start, cost) for every start tried)</returns>
+'''
+
+CHUNKS_PER_WORKER = 8
+
+def bestGreedyTour( costMatrix, deadline, workers=None, onProgress=None ):
+	ncities = len(costMatrix)
+	costs = costMatrix.tolist()
+	neighbors = neighborLists( costMatrix )
+	if workers is not None and workers > 1:
+		nchunks = min( ncities, workers * CHUNKS_PER_WORKER )
+		chunks = [ (list(range(i, ncities, nchunks)), deadline) for i in range(nchunks) ]
+		tours = []
+		nextProgress = time.time() + PROGRESS_INTERVAL
+		with multiprocessing.Pool( workers, initializer=_initWorker, initargs=(costs, neighbors) ) as pool:
+			for chunk in pool.imap_unordered( _greedyChunk, chunks ):
+				tours.extend( chunk )
+				if onProgress is not None and time.time() >= nextProgress:
+					nextProgress = time.time() + PROGRESS_INTERVAL
+					if onProgress( tours ):
+						break											# leaving the with terminates the pool
+		tours.sort( key=lambda tour: tour[0] )
+	else:
+		tours = greedyTours( range(ncities), costs, neighbors, deadline, onProgress )
+
+	bestCost, bestRoute = np.inf, None
+	for start, cost, route in tours:
+		if cost < bestCost:
+			bestCost, bestRoute = cost, route
+	return bestCost, bestRoute, [(start, cost) for start, cost, route in tours]
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+
+import time
+import numpy as np
+
+
+
+''' <summary>
+	Held-Karp dynamic programming over subsets, vectorized with NumPy.  City 0 is the
+	start; the other m = n-1 cities are bits of a mask.  dp[mask, j] is the cheapest
+	path that leaves city 0, visits exactly the cities in mask and ends at city j+1, and
+	parent[mask, j] is the city before j on that path.  Masks are filled one popcount
+	layer at a time: for every end city j, all masks of the layer that contain j are
+	computed at once from the previous layer as min over k of dp[mask - j, k] + cost(k, j).
+	Time is O(2^n n^2) and memory O(2^n n), both independent of the cost values.
+	</summary>
+'''
+
+def memoryEstimate( ncities ):
+	m = max( ncities - 1, 1 )
+	masks = 2**m
+	tables = masks * m * (8 + 1)						# float64 dp and int8 parent
+	indexing = masks * (8 + 8 + 1)						# masks, their int64 argsort order and popcounts
+	largestLayer = masks // 2							# masks of one layer that contain a given city, at most
+	working = largestLayer * m * 8 * 2					# candidate costs and their argmin
+	return tables + indexing + working
+
+
+''' <summary>
+	Solves the tour exactly.
+	</summary>
+	<returns>(cost, path of city indices starting at 0), (np.inf, None) if there is no
+	tour, or (None, None) if the deadline passed first</returns>
+'''
+
+def heldKarp( costMatrix, deadline=None ):
+	n = len(costMatrix)
+	if n == 1:
+		return 0, [0]
+	m = n - 1
+	inner = np.asarray( costMatrix[1:, 1:], dtype=np.float64 )
+	fromStart = np.asarray( costMatrix[0, 1:], dtype=np.float64 )
+	toStart = np.asarray( costMatrix[1:, 0], dtype=np.float64 )
+
+	full = 2**m - 1
+	dp = np.full( (2**m, m), np.inf )
+	parent = np.full( (2**m, m), -1, dtype=np.int8 )
+	for j in range(m):
+		dp[1 << j, j] = fromStart[j]
+
+	masks = np.arange( 2**m, dtype=np.int64 )
+	popcount = np.zeros( 2**m, dtype=np.uint8 )
+	for bit in range(m):
+		popcount += ((masks >> bit) & 1).astype(np.uint8)
+	order = np.argsort( popcount, kind='stable' )
+	layerStarts = np.searchsorted( popcount[order], np.arange(m + 2) )
+
+	for size in range(2, m + 1):
+		if deadline is not None and time.time() >= deadline:
+			return None, None
+		layer = order[layerStarts[size]:layerStarts[size + 1]]
+		for j in range(m):
+			sel = layer[(layer >> j) & 1 == 1]
+			candidates = dp[sel ^ (1 << j)] + inner[:, j]
+			best = candidates.argmin( axis=1 )
+			dp[sel, j] = candidates[np.arange(len(sel)), best]
+			parent[sel, j] = best
+
+	closing = dp[full] + toStart
+	last = int( closing.argmin() )
+	cost = closing[last]
+	if cost == np.inf:
+		return np.inf, None
+
+	path = []
+	mask = full
+	while last >= 0:
+		path.append( last + 1 )
+		previous = int( parent[mask, last] )
+		mask ^= 1 << last
+		last = previous
+	path.append( 0 )
+	path.reverse()
+	return int(cost), path
@@ -0,0 +1,81 @@
+import time
+
+"""
+    Counters and cumulative timers for a solve. Functions wrapped with timed() add their call count and the time spent in
+    them under a name; count() bumps plain counters (e.g. pruning reasons). With sample_interval, sample() records
+    (elapsed seconds, queue size, best cost) at most that often. report() returns everything as plain dictionaries so
+    that worker processes can send theirs back to be merged.
+"""
+class TSPInstrumentation:
+    def __init__(self, sample_interval=None):
+        self.counters = {}
+        self.timers = {}
+        self.samples = []
+        self.sampleInterval = sample_interval
+        self._start = time.perf_counter()
+        self._nextSample = self._start
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+        self.count(name)
+
+    """
+        Wraps a function so that every call is counted and timed under name
+    """
+    def timed(self, name, function):
+        clock = time.perf_counter
+        def wrapper(*args):
+            start = clock()
+            result = function(*args)
+            self.add(name, clock() - start)
+            return result
+        return wrapper
+
+    """
+        Wraps a TSPBounds bound so that its reductions are counted and timed under name
+    """
+    def timedBound(self, name, bound):
+        return _TimedBound(self.timed(name, bound.reduce))
+
+    def sample(self, queueSize, bestCost):
+        if self.sampleInterval is None:
+            return
+        now = time.perf_counter()
+        if now >= self._nextSample:
+            self._nextSample = now + self.sampleInterval
+            self.samples.append((now - self._start, queueSize, bestCost))
+
+    def report(self):
+        return {'counters': dict(self.counters), 'timers': dict(self.timers), 'samples': list(self.samples)}
+
+    """
+        Adds the counters and timers of another report (e.g. from a worker process) to this one; samples are kept
+        side by side
+    """
+    def merge(self, report):
+        for name, n in report['counters'].items():
+            self.count(name, n)
+        for name, seconds in report['timers'].items():
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+        self.samples.extend(report['samples'])
+
+    """
+        A table of the timers (calls, total and mean time) followed by the counters
+    """
+    def summary(self):
+        lines = ['{:<16}{:>12}{:>12}{:>12}'.format('timer', 'calls', 'seconds', 'us/call')]
+        for name in sorted(self.timers, key=self.timers.get, reverse=True):
+            calls = self.counters.get(name, 0)
+            lines.append('{:<16}{:>12}{:>12.3f}{:>12.1f}'.format(name, calls, self.timers[name],
+                                                                  1e6 * self.timers[name] / max(1, calls)))
+        for name in sorted(set(self.counters) - set(self.timers)):
+            lines.append('{:<16}{:>12}'.format(name, self.counters[name]))
+        return '\n'.join(lines)
+
+
+class _TimedBound:
+    def __init__(self, reduce):
+        self.reduce = reduce
@@ -0,0 +1,195 @@
+#!/usr/bin/python3
+
+''' <summary>
+	Reading and writing TSPLIB files: TSP and ATSP instances with EUC_2D, CEIL_2D or
+	EXPLICIT edge weights become Scenarios with the file's costs (see
+	Scenario.fromCostMatrix), scenarios are written as EXPLICIT instances, and tours
+	go both ways.  Files are read a line at a time and numeric sections go straight
+	into NumPy arrays, so large instances are never held as lists of strings.
+
+	scenario = TSPLib.readTSPLIB( 'br17.atsp' )
+	TSPLib.writeTour( results['soln'], 'br17.tour', name='br17' )
+	</summary>
+'''
+
+import os
+import numpy as np
+from TSPClasses import Scenario, DATA_RANGE
+
+
+
+TYPES = ('TSP', 'ATSP')
+EDGE_WEIGHT_TYPES = ('EUC_2D', 'CEIL_2D', 'EXPLICIT')
+_COLUMN_FORMATS = { 'UPPER_COL':'LOWER_ROW', 'LOWER_COL':'UPPER_ROW',	# the same numbers as the transposed row formats
+					'UPPER_DIAG_COL':'LOWER_DIAG_ROW', 'LOWER_DIAG_COL':'UPPER_DIAG_ROW' }
+
+
+
+''' <summary>
+	Reads a TSPLIB instance.  Coordinates (NODE_COORD_SECTION, or DISPLAY_DATA_SECTION
+	for EXPLICIT instances) are only used to compute EUC_2D/CEIL_2D weights and, scaled
+	into DATA_RANGE, to place the cities on screen.
+	</summary>
+	<returns>a Scenario whose costMatrix holds the file's edge weights</returns>
+'''
+def readTSPLIB( path ):
+	with open( path ) as file:
+		return parseTSPLIB( file )
+
+def parseTSPLIB( lines ):
+	lines = (line.strip() for line in lines)
+	lines = (line for line in lines if line)
+	spec = {}
+	coordinates = weights = None
+	fromNodes = False
+	for line in lines:
+		keyword = line.split(':')[0].strip()
+		if keyword == 'EOF':
+			break
+		elif keyword in ('NODE_COORD_SECTION', 'DISPLAY_DATA_SECTION'):
+			ncities = _dimension( spec )
+			nodes = _readNumbers( lines, 3 * ncities ).reshape( ncities, 3 )
+			if not fromNodes:
+				coordinates = np.empty( (ncities, 2) )
+				coordinates[nodes[:, 0].astype(int) - 1] = nodes[:, 1:]
+				fromNodes = keyword == 'NODE_COORD_SECTION'
+		elif keyword == 'EDGE_WEIGHT_SECTION':
+			weights = _readWeights( lines, _dimension(spec), spec.get('EDGE_WEIGHT_FORMAT', 'FULL_MATRIX') )
+		elif keyword.endswith( '_SECTION' ):
+			raise ValueError( 'Unsupported TSPLIB section {}'.format(keyword) )
+		elif ':' in line:
+			spec[keyword] = line.split(':', 1)[1].strip()
+
+	if spec.get('TYPE') not in TYPES:
+		raise ValueError( 'Unsupported TSPLIB TYPE {} (supported: {})'.format(spec.get('TYPE'), ', '.join(TYPES)) )
+	weightType = spec.get( 'EDGE_WEIGHT_TYPE' )
+	if weightType not in EDGE_WEIGHT_TYPES:
+		raise ValueError( 'Unsupported EDGE_WEIGHT_TYPE {} (supported: {})'.format(weightType, ', '.join(EDGE_WEIGHT_TYPES)) )
+	if weightType == 'EXPLICIT':
+		if weights is None:
+			raise ValueError( 'EXPLICIT instance without an EDGE_WEIGHT_SECTION' )
+		matrix = weights
+	else:
+		if not fromNodes:
+			raise ValueError( '{} instance without a NODE_COORD_SECTION'.format(weightType) )
+		distance = np.sqrt( (coordinates[np.newaxis, :, 0] - coordinates[:, np.newaxis, 0])**2 +
+							(coordinates[np.newaxis, :, 1] - coordinates[:, np.newaxis, 1])**2 )
+		matrix = np.floor( distance + 0.5 ) if weightType == 'EUC_2D' else np.ceil( distance )
+	return Scenario.fromCostMatrix( matrix, _display(coordinates) if coordinates is not None else None )
+
+def _dimension( spec ):
+	if 'DIMENSION' not in spec:
+		raise ValueError( 'TSPLIB section before DIMENSION' )
+	return int( spec['DIMENSION'] )
+
+def _readNumbers( lines, count ):
+	values = np.empty( count )
+	filled = 0
+	while filled < count:
+		line = next( lines, None )
+		if line is None:
+			raise ValueError( 'TSPLIB file ends {} numbers into a section of {}'.format(filled, count) )
+		row = np.array( line.split(), dtype=float )
+		if filled + len(row) > count:
+			raise ValueError( 'TSPLIB section has more than {} numbers'.format(count) )
+		values[filled:filled + len(row)] = row
+		filled += len(row)
+	return values
+
+def _readWeights( lines, ncities, format ):
+	format = _COLUMN_FORMATS.get( format, format )
+	if format == 'FULL_MATRIX':
+		return _readNumbers( lines, ncities * ncities ).reshape( ncities, ncities )
+	triangles = { 'UPPER_ROW': lambda: np.triu_indices(ncities, 1), 'UPPER_DIAG_ROW': lambda: np.triu_indices(ncities),
+				  'LOWER_ROW': lambda: np.tril_indices(ncities, -1), 'LOWER_DIAG_ROW': lambda: np.tril_indices(ncities) }
+	if format not in triangles:
+		raise ValueError( 'Unsupported EDGE_WEIGHT_FORMAT {}'.format(format) )
+	rows, cols = triangles[format]()									# row-major, the order the file lists them in
+	matrix = np.zeros( (ncities, ncities) )
+	matrix[rows, cols] = _readNumbers( lines, len(rows) )
+	matrix[cols, rows] = matrix[rows, cols]
+	return matrix
+
+def _display( coordinates ):
+	low, high = coordinates.min( axis=0 ), coordinates.max( axis=0 )
+	xr, yr = DATA_RANGE['x'], DATA_RANGE['y']
+	span = np.maximum( high - low, 1e-12 )
+	scale = min( (xr[1] - xr[0]) / span[0], (yr[1] - yr[0]) / span[1] )
+	center = np.array( [(xr[0] + xr[1]) / 2, (yr[0] + yr[1]) / 2] )
+	return (coordinates - (low + high) / 2) * scale + center
+
+
+''' <summary>
+	Writes scenario as an EXPLICIT TSPLIB instance (TYPE TSP if its costs are
+	symmetric, else ATSP) with a FULL_MATRIX of weights and the city coordinates as
+	DISPLAY_DATA.  TSPLIB has no missing edges, so they are written as a weight larger
+	than any tour of real edges, noted in the COMMENT.  Rows are written one at a time.
+	</summary>
+'''
+def writeTSPLIB( scenario, path, name=None, comment=None ):
+	matrix = scenario.costMatrix
+	ncities = len(matrix)
+	finite = np.isfinite( matrix )
+	missing = int( ((matrix[finite].max() if finite.any() else 0) + 1) * ncities )
+	symmetric = np.array_equal( matrix, matrix.T )
+	if name is None:
+		name = os.path.splitext( os.path.basename(path) )[0]
+	comments = ([comment] if comment else []) + ['missing edges weigh {}'.format(missing)]
+	with open( path, 'w' ) as file:
+		file.write( 'NAME : {}\n'.format(name) )
+		file.write( 'TYPE : {}\n'.format('TSP' if symmetric else 'ATSP') )
+		for line in comments:
+			file.write( 'COMMENT : {}\n'.format(line) )
+		file.write( 'DIMENSION : {}\n'.format(ncities) )
+		file.write( 'EDGE_WEIGHT_TYPE : EXPLICIT\n' )
+		file.write( 'EDGE_WEIGHT_FORMAT : FULL_MATRIX\n' )
+		file.write( 'DISPLAY_DATA_TYPE : TWOD_DISPLAY\n' )
+		file.write( 'EDGE_WEIGHT_SECTION\n' )
+		for row, exists in zip( matrix, finite ):
+			file.write( ' '.join(map(str, np.where(exists, row, missing).astype(np.int64).tolist())) + '\n' )
+		file.write( 'DISPLAY_DATA_SECTION\n' )
+		for city in scenario.getCities():
+			file.write( '{} {!r} {!r}\n'.format(city._index + 1, city._x, city._y) )
+		file.write( 'EOF\n' )
+
+
+''' <summary>
+	Writes a tour (a TSPSolution or a list of city indices) in TSPLIB tour format,
+	cities numbered from 1.
+	</summary>
+'''
+def writeTour( route, path, name=None, comment=None ):
+	if hasattr( route, 'route' ):
+		route = [city._index for city in route.route]
+	if name is None:
+		name = os.path.splitext( os.path.basename(path) )[0]
+	with open( path, 'w' ) as file:
+		file.write( 'NAME : {}\n'.format(name) )
+		if comment:
+			file.write( 'COMMENT : {}\n'.format(comment) )
+		file.write( 'TYPE : TOUR\n' )
+		file.write( 'DIMENSION : {}\n'.format(len(route)) )
+		file.write( 'TOUR_SECTION\n' )
+		for city in route:
+			file.write( '{}\n'.format(int(city) + 1) )
+		file.write( '-1\nEOF\n' )
+
+''' <summary>
+	Reads the first tour of a TSPLIB tour file (e.g. an .opt.tour with a known optimum).
+	</summary>
+	<returns>the tour as a list of city indices from 0</returns>
+'''
+def readTour( path ):
+	route = []
+	with open( path ) as file:
+		lines = (line.strip() for line in file)
+		for line in lines:
+			if line.split(':')[0].strip() == 'TOUR_SECTION':
+				for line in lines:
+					for token in line.split():
+						if int(token) == -1:
+							return route
+						route.append( int(token) - 1 )
+	if not route:
+		raise ValueError( '{} has no TOUR_SECTION'.format(path) )
+	return route
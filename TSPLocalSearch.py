@@ -0,0 +1,345 @@
+#!/usr/bin/python3
+
+import time
+import numpy as np
+from collections import deque
+from itertools import accumulate
+
+
+
+''' <summary>
+	For every city, its k cheapest destinations (or, given the transposed matrix, its
+	k cheapest sources) in increasing order of cost, leaving out missing edges.
+	</summary>
+'''
+
+def candidateLists( costMatrix, k ):
+	ncities = len(costMatrix)
+	k = min(k, ncities - 1)
+	nearest = np.argpartition( costMatrix, k - 1, axis=1 )[:, :k] if k > 0 else np.zeros((ncities, 0), dtype=int)
+	lists = []
+	for i in range(ncities):
+		row = sorted( nearest[i], key=lambda city: costMatrix[i, city] )
+		lists.append( [int(city) for city in row if costMatrix[i, city] != np.inf] )
+	return lists
+
+
+''' <summary>
+	Missing edges become a finite penalty larger than any tour made only of real edges,
+	so local search can work on tours that still use missing edges (and repair them)
+	with exact integer arithmetic instead of inf - inf.
+	</summary>
+'''
+
+def penalizedCosts( costMatrix ):
+	finite = costMatrix[np.isfinite(costMatrix)]
+	penalty = ((finite.max() if len(finite) else 0) + 1) * len(costMatrix)
+	return np.where( np.isfinite(costMatrix), costMatrix, penalty ).tolist()
+
+
+
+''' <summary>
+	2-opt and Or-opt local search for asymmetric costs.  Moves are only tried along the
+	candidate lists of a city (its nearest destinations and sources) and only when the
+	new edge is cheaper than the one it replaces, and cities whose neighborhood had no
+	improving move keep their don't-look bit set until one of their edges changes.
+
+	2-opt reverses a segment, which changes the cost of every edge inside it when costs
+	are asymmetric; prefix sums of each edge's reverse minus forward cost give that
+	change in O(1).  Or-opt moves a segment of 1-3 cities elsewhere without reversing it.
+
+	The tour is an array with each city's position.  A move rewrites only the window
+	of positions it changes (the reversed segment, or the shorter of the two arcs an
+	Or-opt segment can be shifted across), and the prefix sums are kept per block of
+	about sqrt(n) positions plus a prefix over the blocks, so applying a move costs
+	O(window + sqrt(n)) instead of rebuilding the tour.  Windows can still be long:
+	a 2-opt reversal is as long as its segment.
+	</summary>
+'''
+
+class TSPLocalSearch:
+	NEIGHBORS = 10
+	OR_OPT_LENGTHS = (1, 2, 3)
+	PROGRESS_INTERVAL = 0.25										# seconds between onProgress calls
+
+	def __init__( self, costMatrix, route, neighbors=NEIGHBORS ):
+		if isinstance( costMatrix, np.ndarray ):
+			self.costs = penalizedCosts( costMatrix )
+			self.outNeighbors = candidateLists( costMatrix, neighbors )
+			self.inNeighbors = candidateLists( costMatrix.T, neighbors )
+			self._pathCosts = None
+		else:																# a TSPSparse.SparseScenario
+			self.costs = costMatrix.penalizedCosts()
+			self.outNeighbors = costMatrix.candidateLists( neighbors )
+			self.inNeighbors = costMatrix.candidateLists( neighbors, incoming=True )
+			self._pathCosts = costMatrix.penalizedPairCosts				# vectorized, the rows compute one cost at a time
+		self.tour = list(route)
+		self.n = len(self.tour)
+		self.evaluated = 0
+		self.twoOptMoves = 0
+		self.orOptMoves = 0
+		self._nextProgress = 0.0
+		self._journal = None
+		self._refresh()
+
+	''' <summary>
+		Rebuilds the positions, the tour cost and the prefix sums from self.tour, in O(n).
+		</summary>
+	'''
+	def _refresh( self ):
+		c, tour, n = self.costs, self.tour, self.n
+		self.pos = [0] * n
+		for i, city in enumerate(tour):
+			self.pos[city] = i
+		following = tour[1:] + tour[:1]
+		if self._pathCosts is None:
+			forward = [c[a][b] for a, b in zip(tour, following)]
+			backward = [c[b][a] for a, b in zip(tour, following)]
+		else:
+			forward = self._pathCosts( np.array(tour), np.array(following) ).tolist()
+			backward = self._pathCosts( np.array(following), np.array(tour) ).tolist()
+		self._cost = sum( forward )
+		self._forward = forward
+		self._reverse = [b - f for f, b in zip(forward, backward)]		# reverse minus forward cost of the edge leaving each position
+		self._blockSize = max( 1, int(n ** 0.5) )
+		self._inBlock = [0] * (n + 1)										# prefix sums from the start of each position's block
+		self._blockSums = [0] * (n // self._blockSize + 1)
+		for block in range(len(self._blockSums)):
+			self._sumBlock( block )
+		self._sumBlocks()
+
+	def _sumBlock( self, block ):
+		first = block * self._blockSize
+		last = min( first + self._blockSize, self.n )
+		sums = list(accumulate( self._reverse[first:last], initial=0 ))
+		self._inBlock[first:last] = sums[:-1]
+		if block == self.n // self._blockSize:
+			self._inBlock[self.n] = sums[-1]
+		self._blockSums[block] = sums[-1]
+
+	def _sumBlocks( self ):
+		self._blockStarts = [0] + list(accumulate( self._blockSums ))
+
+	def _prefix( self, k ):
+		return self._blockStarts[k // self._blockSize] + self._inBlock[k]
+
+	''' <summary>
+		Sum of the reverse minus forward costs of the count edges leaving positions
+		start, start + 1, ... (cyclically).
+		</summary>
+	'''
+	def _reverseSum( self, start, count ):
+		end = start + count
+		if end <= self.n:
+			return self._prefix( end ) - self._prefix( start )
+		return self._prefix( self.n ) - self._prefix( start ) + self._prefix( end - self.n )
+
+	def _window( self, start, length ):
+		end = start + length
+		if end <= self.n:
+			return self.tour[start:end]
+		return self.tour[start:] + self.tour[:end - self.n]
+
+	''' <summary>
+		Puts cities at positions start, start + 1, ... (cyclically) in place of the
+		cities there, updating the positions, the tour cost and the prefix sums of the
+		edges in and around the window.  With a journal, the cities replaced are logged
+		so the change can be undone (see _undo).
+		</summary>
+	'''
+	def _rewrite( self, start, cities ):
+		tour, pos, n = self.tour, self.pos, self.n
+		if self._journal is not None:
+			self._journal.append( (start, self._window(start, len(cities))) )
+		end = start + len(cities)
+		pieces = [(start, cities)] if end <= n else [(start, cities[:n - start]), (0, cities[n - start:])]
+		for first, part in pieces:
+			tour[first:first + len(part)] = part
+			for p, city in enumerate(part, first):
+				pos[city] = p
+		first = (start - 1) % n												# the edges leaving the positions before and in the window
+		last = first + len(cities) + 1
+		if last <= n:
+			self._recost( first, last )
+		else:
+			self._recost( first, n )
+			self._recost( 0, last - n )
+		self._sumBlocks()
+
+	def _recost( self, first, last ):
+		c, tour = self.costs, self.tour
+		heads = tour[first:last]
+		tails = tour[first + 1:last + 1] if last < self.n else tour[first + 1:] + tour[:1]
+		if self._pathCosts is None:
+			forward = [c[a][b] for a, b in zip(heads, tails)]
+			backward = [c[b][a] for a, b in zip(heads, tails)]
+		else:
+			heads, tails = np.array( heads ), np.array( tails )
+			forward = self._pathCosts( heads, tails ).tolist()
+			backward = self._pathCosts( tails, heads ).tolist()
+		self._cost += sum( forward ) - sum( self._forward[first:last] )
+		self._forward[first:last] = forward
+		self._reverse[first:last] = [b - f for f, b in zip(forward, backward)]
+		for block in range(first // self._blockSize, (last - 1) // self._blockSize + 1):
+			self._sumBlock( block )
+
+	def _undo( self ):
+		journal, self._journal = self._journal, None
+		for start, cities in reversed(journal):
+			self._rewrite( start, cities )
+		self._journal = []
+
+	def cost( self ):
+		return self._cost
+
+	''' <summary>
+		Runs first-improvement local search until no city has an improving move or
+		the deadline passes.  cities limits the cities whose don't-look bits start
+		cleared; by default every city is looked at.  onImprove(route, cost) is called
+		after every improving move and onProgress() every PROGRESS_INTERVAL seconds; if
+		either returns True the search stops.
+		</summary>
+		<returns>the improved route as a list of city indices</returns>
+	'''
+	def improve( self, deadline, cities=None, onImprove=None, onProgress=None ):
+		if self.n < 5:
+			return self.tour
+		queue = deque( self.tour if cities is None else cities )
+		queued = bytearray( self.n )
+		for city in queue:
+			queued[city] = 1
+		while queue:
+			now = time.time()
+			if now >= deadline:
+				break
+			if onProgress is not None and now >= self._nextProgress:
+				self._nextProgress = now + self.PROGRESS_INTERVAL
+				if onProgress():
+					break
+			city = queue.popleft()
+			queued[city] = 0
+			touched = self._improveCity( city )
+			if touched:
+				if onImprove is not None and onImprove( self.tour, self.cost() ):
+					break
+				for other in touched:
+					if not queued[other]:
+						queued[other] = 1
+						queue.append( other )
+		return self.tour
+
+	def _improveCity( self, a ):
+		touched = self._twoOptFrom( a )
+		if touched is None:
+			touched = self._orOptFrom( a )
+		return touched
+
+	def _succ( self, city ):
+		return self.tour[self.pos[city] + 1 - self.n]
+
+	def _pred( self, city ):
+		return self.tour[self.pos[city] - 1]
+
+	''' <summary>
+		2-opt removing the edges leaving positions i and j and adding (t[i], t[j]) and
+		(t[i+1], t[j+1]), which reverses t[i+1..j] (cyclically).
+		</summary>
+	'''
+	def _twoOptDelta( self, i, j ):
+		n = self.n
+		if j < i:
+			j += n
+		if j - i < 2:
+			return None, j
+		c, t = self.costs, self.tour
+		a, b, e, f = t[i], t[(i+1) % n], t[j % n], t[(j+1) % n]
+		inner = self._reverseSum( (i+1) % n, j - i - 1 )
+		self.evaluated += 1
+		return c[a][e] + c[b][f] - c[a][b] - c[e][f] + inner, j
+
+	def _applyTwoOpt( self, i, j ):
+		n = self.n
+		segment = self._window( (i+1) % n, j - i )
+		touched = [self.tour[i], segment[0], segment[-1], self.tour[(j+1) % n]]
+		self._rewrite( (i+1) % n, segment[::-1] )
+		self.twoOptMoves += 1
+		return touched
+
+	def _twoOptFrom( self, a ):
+		c, pos = self.costs, self.pos
+		b = self._succ( a )
+		for e in self.outNeighbors[a]:					# new edge (a, e) replaces (a, succ a)
+			if c[a][e] >= c[a][b]:
+				break
+			delta, j = self._twoOptDelta( pos[a], pos[e] )
+			if delta is not None and delta < 0:
+				return self._applyTwoOpt( pos[a], j )
+		e = self._pred( a )
+		for b in self.inNeighbors[a]:					# new edge (b, a) replaces (pred a, a)
+			if c[b][a] >= c[e][a]:
+				break
+			i = (pos[b] - 1) % self.n
+			delta, j = self._twoOptDelta( i, (pos[a] - 1) % self.n )
+			if delta is not None and delta < 0:
+				return self._applyTwoOpt( i, j )
+		return None
+
+	''' <summary>
+		Or-opt moving the segment of length L starting at position s between x and its
+		successor, keeping the segment's direction.
+		</summary>
+	'''
+	def _orOptDelta( self, s, L, x ):
+		n = self.n
+		if (self.pos[x] - s) % n < L:
+			return None
+		c, t = self.costs, self.tour
+		p, first, last, q = t[s-1], t[s], t[(s+L-1) % n], t[(s+L) % n]
+		if x == p:
+			return None
+		y = self._succ( x )
+		self.evaluated += 1
+		return c[p][q] + c[x][first] + c[last][y] - c[p][first] - c[last][q] - c[x][y]
+
+	''' <summary>
+		Shifts the cities between the segment and x back over the segment, or those
+		between x and the segment forward, whichever arc is shorter; both give the same
+		cyclic tour.
+		</summary>
+	'''
+	def _applyOrOpt( self, s, L, x ):
+		n, pos = self.n, self.pos
+		segment = self._window( s, L )
+		y = self._succ( x )
+		touched = [self.tour[s-1], segment[0], segment[-1], self.tour[(s+L) % n], x, y]
+		after = (pos[x] - (s + L - 1)) % n								# cities from the segment's end to x
+		if L + after <= n - after:
+			self._rewrite( s, self._window((s+L) % n, after) + segment )
+		else:
+			self._rewrite( pos[y], segment + self._window(pos[y], n - L - after) )
+		self.orOptMoves += 1
+		return touched
+
+	def _orOptFrom( self, a ):
+		c, pos, n = self.costs, self.pos, self.n
+		for L in self.OR_OPT_LENGTHS:
+			if L > n - 3:
+				break
+			s = pos[a]											# segment starting at a: new edge (x, a)
+			p = self._pred( a )
+			for x in self.inNeighbors[a]:
+				if c[x][a] >= c[p][a]:
+					break
+				delta = self._orOptDelta( s, L, x )
+				if delta is not None and delta < 0:
+					return self._applyOrOpt( s, L, x )
+			s = (pos[a] - L + 1) % n							# segment ending at a: new edge (a, y)
+			q = self._succ( a )
+			for y in self.outNeighbors[a]:
+				if c[a][y] >= c[a][q]:
+					break
+				x = self._pred( y )
+				delta = self._orOptDelta( s, L, x )
+				if delta is not None and delta < 0:
+					return self._applyOrOpt( s, L, x )
+		return None
@@ -0,0 +1,48 @@
+"""
+    Search policies for branch and bound. A policy decides the order states leave the frontier through key(state), a
+    tuple compared by the heap (smallest first) instead of calling TSPState.__lt__ on every comparison. byBound is set
+    if the key starts with the state's bound, so the top of the heap holds the frontier's lowest bound. Two more
+    attributes change how the search expands a state: if dives is set, the cheapest child is expanded next directly
+    instead of being queued, and if width is set, only the width cheapest children of each state are kept, which bounds
+    memory but makes the search a heuristic (the rest count as pruned).
+"""
+
+"""
+    Deepest path first, then the lowest bound: finds complete tours quickly and keeps the queue small. This is the
+    order TSPState.__lt__ defines, and the default.
+"""
+class DepthFirst:
+    byBound = False
+    dives = False
+    width = None
+
+    def key(self, state):
+        return (-len(state.path), state.bestCost)
+
+"""
+    Lowest bound first, deepest first among equal bounds: expands the fewest states to prove optimality, but the queue
+    can grow very large before a better tour is found.
+"""
+class BestFirst:
+    byBound = True
+    dives = False
+    width = None
+
+    def key(self, state):
+        return (state.bestCost, -len(state.path))
+
+"""
+    Best-first selection with a depth-first dive from every selected state: its cheapest child is expanded next, and so
+    on down to a leaf or a pruned state, while the siblings along the way are queued by bound. Finds tours like
+    depth-first while still working on the most promising part of the tree.
+"""
+class Hybrid(BestFirst):
+    dives = True
+
+"""
+    Depth-first keeping only the width cheapest children of every state. The queue holds at most about
+    width * n states, at the cost of optimality.
+"""
+class Beam(DepthFirst):
+    def __init__(self, width=3):
+        self.width = width
@@ -1,24 +1,20 @@
 #!/usr/bin/python3
 
-from which_pyqt import PYQT_VER
-if PYQT_VER == 'PYQT5':
-	from PyQt5.QtCore import QLineF, QPointF
-elif PYQT_VER == 'PYQT4':
-	from PyQt4.QtCore import QLineF, QPointF
-else:
-	raise Exception('Unsupported Version of PyQt: {}'.format(PYQT_VER))
-
-
-
-
 import time
+import cProfile
+import pstats
 import numpy as np
 from TSPClasses import *
 from TSPState import TSPState
-import heapq
-import itertools
-from heapq import heappop, heappush
-from copy import deepcopy
+from TSPFrontier import TSPFrontier
+from TSPInstrumentation import TSPInstrumentation
+import TSPBranchAndBound
+import TSPGreedy
+import TSPSparse
+from TSPLocalSearch import TSPLocalSearch
+from TSPThreeOpt import TSPThreeOpt
+from TSPAnnealing import TSPAnnealing
+import TSPHeldKarp
 
 
 
@@ -30,38 +26,119 @@ class TSPSolver:
 		self._scenario = scenario
 
 
+	''' <summary>
+		Builds the function the solvers call with each improved tour, report(route,
+		states, bound=None), which passes it to callback(solution, progress) with the
+		time, states, lower bound and gap (see the README).  bound is a live bound when
+		the solver has one, else this one, by default the root reduced cost matrix's.
+		</summary>
+		<returns>report returning True to stop, or None if there is no callback</returns>
+	'''
+
+	def _reporter( self, callback, start_time, bound=None ):
+		if callback is None:
+			return None
+		if bound is None and not self._isSparse():
+			root = TSPState([0], 0)
+			root.initMatrix(self._scenario)
+			root.reduceMatrix()
+			bound = root.bestCost
+		cities = self._scenario.getCities()
+		def report( route, states, live=None ):
+			solution = TSPSolution([cities[i] for i in route])
+			cost = solution.cost
+			lower = live if live is not None else bound
+			progress = {'time': time.time() - start_time, 'states': states, 'bound': lower, 'gap': self._gap(cost, lower)}
+			return bool(callback(solution, progress))
+		return report
+
+	''' <summary>
+		The gap (cost - bound) / cost of a tour to a lower bound: None without a bound,
+		and inf without a tour.
+		</summary>
+	'''
+	def _gap( self, cost, bound ):
+		if bound is None:
+			return None
+		if cost == np.inf:
+			return np.inf
+		return (cost - bound) / cost if cost > 0 else 0.0
+
+	def _isSparse( self ):
+		return isinstance( self._scenario, TSPSparse.SparseScenario )
+
+	''' <summary>
+		What TSPLocalSearch takes as costs: the dense cost matrix, or a sparse scenario
+		itself.
+		</summary>
+	'''
+	def _localSearchCosts( self ):
+		return self._scenario if self._isSparse() else self._scenario.costMatrix
+
+	''' <summary>
+		Runs greedy for a solver's starting tour, passing on the solver's progress so
+		that a stop requested during the greedy phase is honored.
+		</summary>
+		<returns>True if progress asked to stop</returns>
+	'''
+	def _greedySeed( self, time_allowance, progress ):
+		stopped = False
+		def onProgress( stats ):
+			nonlocal stopped
+			stopped = stopped or bool(progress(stats))
+			return stopped
+		self.greedy(time_allowance, progress=onProgress if progress is not None else None)
+		return stopped
+
+
 	''' <summary>
 		This is the entry point for the default solver
 		which just finds a valid random tour.  Note this could be used to find your
-		initial BSSF.
+		initial BSSF.  Random permutations are drawn and costed in batches (see
+		Scenario.tourCosts), starting with one and doubling up to RANDOM_TOUR_BATCH
+		cities' worth, so easy instances still stop at the first valid tour.
 		</summary>
 		<returns>results dictionary for GUI that contains three ints: cost of solution, 
 		time spent to find solution, number of permutations tried during search, the 
 		solution found, and three null values for fields not used for this 
 		algorithm</returns> 
 	'''
+
+	RANDOM_TOUR_BATCH = 2**18
 	
-	def defaultRandomTour( self, time_allowance=60.0 ):
+	def defaultRandomTour( self, time_allowance=60.0, callback=None, progress=None ):
 		results = {}
 		cities = self._scenario.getCities()
 		ncities = len(cities)
 		foundTour = False
 		count = 0
 		bssf = None
+		batch = 1
 		start_time = time.time()
+		nextProgress = start_time + TSPBranchAndBound.PROGRESS_INTERVAL
 		while not foundTour and time.time()-start_time < time_allowance:
-			# create a random permutation
-			perm = np.random.permutation( ncities )
-			route = []
-			# Now build the route using the random permutation
-			for i in range( ncities ):
-				route.append( cities[ perm[i] ] )
-			bssf = TSPSolution(route)
-			count += 1
-			if bssf.cost < np.inf:
+			if progress is not None and time.time() >= nextProgress:
+				nextProgress = time.time() + TSPBranchAndBound.PROGRESS_INTERVAL
+				if progress({'count': count}):
+					break
+			# create a batch of random permutations, one per row
+			perms = np.random.random( (batch, ncities) ).argsort( axis=1 )
+			costs = self._scenario.tourCosts( perms )
+			valid = np.flatnonzero( costs < np.inf )
+			if len(valid) > 0:
 				# Found a valid route
+				perm = perms[valid[0]]
+				count += int(valid[0]) + 1
 				foundTour = True
+			else:
+				perm = perms[-1]
+				count += batch
+				batch = min( 2*batch, max(1, self.RANDOM_TOUR_BATCH // ncities) )
+			bssf = TSPSolution( [cities[i] for i in perm] )
 		end_time = time.time()
+		report = self._reporter(callback, start_time)
+		if report is not None and foundTour:
+			report(list(perm), count)
 		results['cost'] = bssf.cost if foundTour else math.inf
 		results['time'] = end_time - start_time
 		results['count'] = count
@@ -73,57 +150,40 @@ class TSPSolver:
 
 
 	''' <summary>
-		This is the entry point for the greedy solver, which you must implement for 
-		the group project (but it is probably a good idea to just do it for the branch-and
-		bound project as a way to get your feet wet).  Note this could be used to find your
-		initial BSSF.
+		This is the entry point for the greedy solver: a nearest neighbor tour from every
+		start city (see TSPGreedy, or TSPSparse for a sparse scenario), keeping the cheapest.  workers > 1 spreads the start
+		cities over a process pool.  Note this could be used to find your initial BSSF.
 		</summary>
 		<returns>results dictionary for GUI that contains three ints: cost of best solution, 
 		time spent to find best solution, total number of solutions found, the best
 		solution found, and three null values for fields not used for this 
-		algorithm</returns> 
+		algorithm.  'starts' lists (start city index, tour cost) for every start tried,
+		with np.inf for starts that got stuck.</returns> 
 	'''
 
-	def greedy( self,time_allowance=60.0 ):
+	def greedy( self,time_allowance=60.0, workers=None, callback=None, progress=None ):
 		results = {}
 		cities = self._scenario.getCities()
-		ncities = len(cities)
-		count = 0
 		bssf = TSPSolution(cities)
 		start_time = time.time()
-		startIndex = 0
-		startCity = cities[startIndex]
-		currentCity = startCity
-		route = []
-		while time.time()-start_time < time_allowance and startIndex < len(cities) - 1:				# iterates through every greedy solution and keeps the best one O(n^2)
-			next = None
-
-			for city in cities:
-				if city != currentCity and city not in route:
-					if next == None and currentCity.costTo(city) != np.inf:
-						next = city
-					elif next != None:
-						if currentCity.costTo(city) < currentCity.costTo(next):
-							next = city
-
-			if next == None:
-				startIndex += 1
-				currentCity = cities[startIndex]
-				route = []
-			else:
-				route.append(next)
-				currentCity = next
-				if len(route) == ncities:
-					potential_bssf = TSPSolution(route)
-					if potential_bssf.cost < bssf.cost:
-						# Found a valid route
-						bssf = TSPSolution(route)
-						count += 1
-					startIndex += 1
-					currentCity = cities[startIndex]
-					route = []
-			
+		onProgress = None
+		if progress is not None:
+			onProgress = lambda tours: progress({'cost': min([tour[1] for tour in tours], default=np.inf),
+												 'count': len([tour for tour in tours if tour[1] < np.inf])})
+		if self._isSparse():
+			cost, route, starts = TSPSparse.bestGreedyTour(self._scenario, start_time + time_allowance, onProgress, workers)
+		else:
+			cost, route, starts = TSPGreedy.bestGreedyTour(self._scenario.costMatrix, start_time + time_allowance, workers,
+														   onProgress)
+		if route is not None and cost < bssf.cost:
+			bssf = TSPSolution([cities[i] for i in route])
+		count = len([start for start in starts if start[1] < np.inf])
 		end_time = time.time()
+		report = self._reporter(callback, start_time)
+		if report is not None and route is not None:
+			report(route, len(starts))
+		if progress is not None:
+			progress({'cost': bssf.cost, 'count': count})
 		self.greedyRoute = bssf.route
 		results['cost'] = bssf.cost
 		results['time'] = end_time - start_time
@@ -132,99 +192,287 @@ class TSPSolver:
 		results['max'] = None
 		results['total'] = None
 		results['pruned'] = None
+		results['starts'] = starts
 		return results
 	
 	
 	
 	''' <summary>
-		This is the entry point for the branch-and-bound algorithm that you will implement
+		This is the entry point for the branch-and-bound algorithm that you will implement.
+		The BSSF is initial_tour or the greedy tour; the options bound the memory used,
+		choose the lower bound, search policy and workers, instrument the search or stop
+		it within target_gap of the optimum (see the README).
 		</summary>
 		<returns>results dictionary for GUI that contains three ints: cost of best solution, 
 		time spent to find best solution, total number solutions found during search (does
 		not include the initial BSSF), the best solution found, and three more ints: 
-		max queue size, total number of states created, and number of pruned states.</returns> 
+		max queue size, total number of states created, and number of pruned states,
+		plus 'spilled', 'instrument', and the lower 'bound' and 'gap'.</returns> 
 	'''
 		
-	def branchAndBound( self, time_allowance=60.0 ):
+	def branchAndBound( self, time_allowance=60.0, matrix_dtype=np.float64, max_states=None, max_memory=None,
+						workers=None, lower_bound=None, delta_matrices=False, callback=None,
+						progress=None, instrument=None, profile=None,
+						policy=None, initial_tour=None, upper_bound=None, target_gap=None ):
+		if self._isSparse():
+			raise ValueError('Branch and bound needs the full cost matrix, which a sparse scenario does not have')
 		results = {}
 		cities = self._scenario.getCities()
 		ncities = len(cities)
+		if instrument is True:
+			instrument = TSPInstrumentation()
 		foundTour = False
-		count = 0
-		bssf = None
-		startIndex = 0
-		startCity = cities[startIndex]
-		currentCity = startCity
-		self.greedy()
-		route = self.greedyRoute
-		bssf = TSPSolution(route)
-		foundTour = True
-		heap = []
-		iState = TSPState([cities[0]], cities, 0)
-		iState.initMatrix()
-		iState.reduceMatrix()
-		heappush(heap, iState)
+		if initial_tour is not None and sorted(initial_tour) != list(range(ncities)):
+			raise ValueError('initial_tour must visit each of the {} cities once, by index from 0'.format(ncities))
 		start_time = time.time()
-		maxHeapSize = 1
-		totalStates = 1
-		prunedStates = 0
+		bssf = TSPSolution([cities[i] for i in initial_tour]) if initial_tour is not None else None
+		stopped = False
+		if bssf is None or bssf.cost == np.inf:
+			stopped = self._greedySeed(time_allowance, progress)
+			bssf = TSPSolution(self.greedyRoute)
+		foundTour = True
+		iState = TSPState([0], 0)
+		iState.initMatrix(self._scenario, matrix_dtype)
+		iState.reduceMatrix(lower_bound)
+		bound = iState.bestCost
+		bssfPath = [city._index for city in bssf.route]
+		limit = bssf.cost if upper_bound is None else min(bssf.cost, upper_bound)
+		report = self._reporter(callback, start_time, bound)
+		tourCost = bssf.cost
+		def closeEnough():
+			return target_gap is not None and tourCost < np.inf and tourCost - bound <= target_gap * tourCost
+		deadline = start_time if stopped else start_time + time_allowance
+		if (report is not None and report(bssfPath, 0)) or closeEnough():
+			deadline = start_time											# the first tour is good enough, don't search
+		onImprove = onBound = None
+		if report is not None or target_gap is not None:
+			def onImprove(path, cost, states, liveBound):
+				nonlocal bound, tourCost
+				bound, tourCost = max(bound, liveBound), cost
+				stop = report is not None and report(path, states, bound)
+				return stop or closeEnough()
+		if target_gap is not None:
+			def onBound(liveBound):
+				nonlocal bound
+				bound = max(bound, liveBound)
+				return closeEnough()
 		print("starting b&b")
-		while (time.time()-start_time) < time_allowance and len(heap) > 0:					# searches state while there are potentially better paths, worst case O(n!), but approximates to O(n^k), where k = total states - pruned states
-			if len(heap) > maxHeapSize:														# if current heapsize is greater than max size so far, set max size 
-				maxHeapSize = len(heap)														# so far to current heap size
-
-			currentState = heappop(heap)													# pop best potential solution off queue
-			if currentState.bestCost < bssf.cost:											# if the state cost is potentially better than current cost, continue
-				if len(currentState.path) == len(cities):									# if every city is in the path, verify that the path is a cycle
-					lastCost = currentState.path[-1].costTo(currentState.path[0])
-					currentState.bestCost += lastCost
-					if currentState.bestCost < bssf.cost:									# if state path is a cycle, set best cost and best path to state path and cost
-						bssf = TSPSolution(deepcopy(currentState.path))
-						count += 1
-				else:
-					for city in cities:
-						if not currentState.inPath(city):									# visit every city that has not been visited by the current path
-							totalStates += 1
-							newPath = currentState.path.copy()
-							newPath.append(city)
-							newState = TSPState(newPath, cities, currentState.bestCost)
-							newState.costMatrix = np.copy(currentState.costMatrix)
-							city1 = newState.path[newState.len() - 2]
-							city2 = newState.path[newState.len() - 1]
-							newState.coverCities(city1._index, city2._index)
-							newState.reduceMatrix()
-							if newState.bestCost < bssf.cost:								# if state is potentially better than current best, push onto heap, else, prune state
-								heappush(heap, newState)
-							else:
-								prunedStates += 1
-			else:																			# if state cost is worse than best cost, prune state				
-				prunedStates += 1			
-			
+		if profile:
+			profiler = cProfile.Profile()
+			profiler.enable()
+		if workers is not None and workers > 1:
+			stats = TSPBranchAndBound.parallelSearch(iState, self._scenario.costMatrix, limit, bssfPath,
+													 deadline, workers, max_states, max_memory, lower_bound,
+													 delta_matrices, onImprove, progress, instrument, policy, onBound)
+		else:
+			heap = TSPFrontier(max_states, max_memory, policy)
+			heap.push(iState)
+			stats = TSPBranchAndBound.search(heap, self._scenario.costMatrix, limit, bssfPath,
+											 deadline, lowerBound=lower_bound, deltas=delta_matrices, onImprove=onImprove,
+											 onProgress=progress, instrument=instrument, policy=policy, onBound=onBound)
+			stats['spilled'] = heap.spilled
+			heap.close()
+		if profile:
+			profiler.disable()
+			if profile is True:
+				pstats.Stats(profiler).sort_stats('time').print_stats(30)
+			else:
+				profiler.dump_stats(profile)
+		if stats['path'] is not bssfPath:
+			bssf = TSPSolution([cities[i] for i in stats['path']])
 		end_time = time.time()
 		print("ending b&b")
 		results['cost'] = bssf.cost if foundTour else math.inf
 		results['time'] = end_time - start_time
-		results['count'] = count
+		results['count'] = stats['count']
 		results['soln'] = bssf
-		results['max'] = maxHeapSize
-		results['total'] = totalStates
-		results['pruned'] = prunedStates + len(heap)
+		results['max'] = stats['max']
+		results['total'] = stats['total'] + 1
+		results['pruned'] = stats['pruned']
+		results['spilled'] = stats['spilled']
+		results['instrument'] = instrument.report() if instrument is not None else None
+		bound = max(bound, stats['bound'])
+		results['bound'] = bound
+		results['gap'] = self._gap(bssf.cost, bound)
 		return results
 
 
 
 	''' <summary>
-		This is the entry point for the algorithm you'll write for your group project.
+		This is the entry point for the algorithm you'll write for your group project:
+		the greedy tour improved by 2-opt and Or-opt local search (see TSPLocalSearch)
+		until no improving move is left or time runs out.
 		</summary>
 		<returns>results dictionary for GUI that contains three ints: cost of best solution, 
-		time spent to find best solution, total number of solutions found during search, the 
-		best solution found.  You may use the other three field however you like.
-		algorithm</returns> 
+		time spent to find best solution, number of improving moves made, the 
+		best solution found, and 'total' holds the number of candidate moves evaluated.
+		'twoOpt' and 'orOpt' count the improving moves of each kind.</returns> 
 	'''
 		
-	def fancy( self,time_allowance=60.0 ):
-		pass
-		
+	def fancy( self,time_allowance=60.0, callback=None, progress=None ):
+		results = {}
+		cities = self._scenario.getCities()
+		start_time = time.time()
+		share = TSPSparse.GREEDY_SHARE if self._isSparse() else 1.0
+		stopped = self._greedySeed(time_allowance * share, progress)
+		route = [city._index for city in self.greedyRoute]
+		search = TSPLocalSearch(self._localSearchCosts(), route)
+		deadline = start_time if stopped else start_time + time_allowance
+		report = self._reporter(callback, start_time)
+		onImprove = None
+		if report is not None:
+			onImprove = lambda route, cost: report(route, search.evaluated)
+			if report(route, 0):
+				deadline = start_time										# the greedy tour is good enough, don't search
+		onProgress = None
+		if progress is not None:
+			onProgress = lambda: progress({'count': search.twoOptMoves + search.orOptMoves, 'total': search.evaluated})
+		route = search.improve(deadline, onImprove=onImprove, onProgress=onProgress)
+		bssf = TSPSolution([cities[i] for i in route])
+		end_time = time.time()
+		results['cost'] = bssf.cost
+		results['time'] = end_time - start_time
+		results['count'] = search.twoOptMoves + search.orOptMoves
+		results['soln'] = bssf
+		results['max'] = None
+		results['total'] = search.evaluated
+		results['pruned'] = None
+		results['twoOpt'] = search.twoOptMoves
+		results['orOpt'] = search.orOptMoves
+		return results
+
+
 
+	''' <summary>
+		Iterated 3-opt for large (asymmetric) instances: the greedy tour improved with
+		2-opt, Or-opt and sequential segment-exchange 3-opt moves, then kicked and
+		re-optimized until time runs out (see TSPThreeOpt).
+		</summary>
+		<returns>results dictionary for GUI that contains three ints: cost of best solution, 
+		time spent to find best solution, number of kicks that improved the best tour, the 
+		best solution found, and 'total' holds the number of kicks tried.</returns> 
+	'''
+
+	def threeOpt( self, time_allowance=60.0, seed=None, callback=None, progress=None ):
+		results = {}
+		cities = self._scenario.getCities()
+		start_time = time.time()
+		share = TSPSparse.GREEDY_SHARE if self._isSparse() else 1.0
+		stopped = self._greedySeed(time_allowance * share, progress)
+		route = [city._index for city in self.greedyRoute]
+		search = TSPThreeOpt(self._localSearchCosts(), route, seed=seed)
+		deadline = start_time if stopped else start_time + time_allowance
+		report = self._reporter(callback, start_time)
+		onImprove = None
+		if report is not None:
+			onImprove = lambda route, cost: report(route, search.evaluated)
+			if report(route, 0):
+				deadline = start_time
+		onProgress = None
+		if progress is not None:
+			onProgress = lambda: progress({'count': search.improvements, 'total': search.kicks})
+		route = search.solve(deadline, onImprove, onProgress)
+		bssf = TSPSolution([cities[i] for i in route])
+		end_time = time.time()
+		results['cost'] = bssf.cost
+		results['time'] = end_time - start_time
+		results['count'] = search.improvements
+		results['soln'] = bssf
+		results['max'] = None
+		results['total'] = search.kicks
+		results['pruned'] = None
+		return results
+
+
+
+	''' <summary>
+		Simulated annealing from the greedy tour with O(1) swap and segment moves (see
+		TSPAnnealing).  schedule is a TSPAnnealing cooling schedule, GeometricCooling or
+		LinearCooling, whose temperatures are calibrated from the tour unless given;
+		seed fixes the moves drawn (the temperature still follows the clock).  The
+		greedy tour gets at most ANNEALING_GREEDY_SHARE of time_allowance.  It needs the
+		full cost matrix, so sparse scenarios raise a ValueError.
+		</summary>
+		<returns>results dictionary for GUI that contains three ints: cost of best solution, 
+		time spent to find best solution, number of times the best tour improved, the 
+		best solution found, and 'total' holds the number of moves evaluated, 'max' the
+		number accepted and 'pruned' the number rejected (also as 'accepted' and
+		'rejected').</returns> 
+	'''
+
+	ANNEALING_GREEDY_SHARE = 0.1
+
+	def simulatedAnnealing( self, time_allowance=60.0, schedule=None, seed=None, callback=None, progress=None ):
+		results = {}
+		cities = self._scenario.getCities()
+		costMatrix = self._scenario.costMatrix
+		start_time = time.time()
+		stopped = self._greedySeed(time_allowance * self.ANNEALING_GREEDY_SHARE, progress)
+		route = [city._index for city in self.greedyRoute]
+		search = TSPAnnealing(costMatrix, route, schedule, seed)
+		deadline = start_time if stopped else start_time + time_allowance
+		report = self._reporter(callback, start_time)
+		onImprove = None
+		if report is not None:
+			onImprove = lambda route, cost: report(route, search.total)
+			if report(route, 0):
+				deadline = start_time
+		onProgress = None
+		if progress is not None:
+			onProgress = lambda: progress({'count': search.improvements, 'total': search.total,
+										   'max': search.accepted, 'pruned': search.rejected})
+		route = search.anneal(deadline, onImprove, onProgress)
+		bssf = TSPSolution([cities[i] for i in route])
+		end_time = time.time()
+		results['cost'] = bssf.cost
+		results['time'] = end_time - start_time
+		results['count'] = search.improvements
+		results['soln'] = bssf
+		results['max'] = search.accepted
+		results['total'] = search.total
+		results['pruned'] = search.rejected
+		results['accepted'] = search.accepted
+		results['rejected'] = search.rejected
+		return results
 
 
+
+	''' <summary>
+		Exact Held-Karp dynamic programming solver (see TSPHeldKarp).  Its time and
+		memory depend only on the number of cities, so it refuses, with a ValueError,
+		instances above max_cities or whose estimated memory exceeds max_memory bytes.
+		</summary>
+		<returns>results dictionary for GUI that contains three ints: cost of best solution, 
+		time spent to find best solution, 1 if a tour was found, the best solution found
+		(None if time ran out first), and 'memory' holds the estimated bytes used.</returns> 
+	'''
+
+	HELD_KARP_MAX_CITIES = 20
+
+	def heldKarp( self, time_allowance=60.0, max_cities=HELD_KARP_MAX_CITIES, max_memory=None, callback=None,
+				  progress=None ):
+		results = {}
+		cities = self._scenario.getCities()
+		ncities = len(cities)
+		estimate = TSPHeldKarp.memoryEstimate(ncities)
+		if ncities > max_cities or (max_memory is not None and estimate > max_memory):
+			raise ValueError('Held-Karp on {} cities needs about {:.0f} MB (limits: {} cities, {} bytes)'.format(
+				ncities, estimate / 2**20, max_cities, max_memory))
+		start_time = time.time()
+		cost, path = TSPHeldKarp.heldKarp(self._scenario.costMatrix, start_time + time_allowance)
+		bssf = TSPSolution([cities[i] for i in path]) if path is not None else None
+		end_time = time.time()
+		report = self._reporter(callback, start_time, cost)
+		if report is not None and bssf is not None:
+			report(path, 2**(ncities - 1))
+		if progress is not None:
+			progress({'cost': bssf.cost if bssf is not None else math.inf, 'count': 1 if bssf is not None else 0})
+		results['cost'] = bssf.cost if bssf is not None else math.inf
+		results['time'] = end_time - start_time
+		results['count'] = 1 if bssf is not None else 0
+		results['soln'] = bssf
+		results['max'] = None
+		results['total'] = None
+		results['pruned'] = None
+		results['memory'] = estimate
+		return results
@@ -0,0 +1,424 @@
+import unittest
+import itertools
+import subprocess
+import sys
+import io
+import contextlib
+import time
+import os
+import pstats
+import pickle
+import tempfile
+import tracemalloc
+import numpy as np
+from TSPClasses import *
+from TSPSolver import *
+from TSPBenchmark import runOne
+from TSPCache import TSPCache
+from TSPState import TSPState
+import TSPBounds
+import TSPPolicies
+import TSPSparse
+import TSPLib
+import TSPHeldKarp
+from TSPInstrumentation import TSPInstrumentation
+from TSPAnnealing import TSPAnnealing, LinearCooling
+from TSPLocalSearch import TSPLocalSearch, penalizedCosts
+from TSPThreeOpt import TSPThreeOpt
+
+def bruteForceCost(scenario):
+    matrix = scenario.costMatrix
+    ncities = len(matrix)
+    best = np.inf
+    for perm in itertools.permutations(range(1, ncities)):
+        path = (0,) + perm
+        cost = sum(matrix[path[i], path[(i + 1) % ncities]] for i in range(ncities))
+        best = min(best, cost)
+    return best
+
+class TestTSPSolver(unittest.TestCase):
+    def setUp(self):
+        self.scenario = newScenario(8, 20, "Hard (Deterministic)")
+        self.solver = TSPSolver(None)
+        self.solver.setupWithScenario(self.scenario)
+
+    def solve(self, algorithm, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return getattr(self.solver, algorithm)(**kwargs)
+
+    def solve_on(self, scenario, algorithm, **kwargs):
+        solver = TSPSolver(None)
+        solver.setupWithScenario(scenario)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return getattr(solver, algorithm)(**kwargs)
+
+    def test_import_without_qt(self):
+        code = "import sys, TSPSolver, TSPBenchmark; print('PyQt5' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "False")
+        code = "import sys, TSPCache; TSPCache.TSPCache().scenario((5, 1, 'Easy', 1)); print('TSPBenchmark' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "False")
+
+    def test_scenario_locations(self):
+        points = newPoints(8, 20)
+        fromArray = Scenario(np.array(points), "Hard (Deterministic)", 20)
+        self.assertTrue(np.array_equal(fromArray.costMatrix, self.scenario.costMatrix))
+
+    def test_batch_tour_costs(self):
+        cities = self.scenario.getCities()
+        tours = np.random.RandomState(3).random_sample((500, 8)).argsort(axis=1)
+        costs = self.scenario.tourCosts(tours)
+        self.assertEqual(costs.shape, (500,))
+        self.assertTrue(np.isinf(costs).any() and np.isfinite(costs).any())
+        for tour, cost in zip(tours, costs):
+            self.assertEqual(cost, TSPSolution([cities[i] for i in tour]).cost)
+        self.assertEqual(list(self.scenario.tourCosts(tours[0])), [costs[0]])
+
+        results = self.solve("defaultRandomTour", time_allowance=60.0)
+        self.assertEqual(results['cost'], results['soln'].cost)
+        self.assertLess(results['cost'], np.inf)
+
+    def test_generator_versions(self):
+        legacy = newScenario(40, 5, "Hard (Deterministic)")
+        self.assertTrue(np.array_equal(legacy._edge_exists,
+                                       newScenario(40, 5, "Hard (Deterministic)", generator_version=1)._edge_exists))
+        current = newScenario(40, 5, "Hard (Deterministic)", generator_version=2)
+        again = newScenario(40, 5, "Hard (Deterministic)", generator_version=2)
+        self.assertTrue(np.array_equal(current._edge_exists, again._edge_exists))
+        for scenario in (legacy, current, newScenario(40, 5, "Hard")):
+            removed = 40 * 39 - scenario._edge_exists.sum()
+            self.assertEqual(removed, int(0.2 * 40 * 39))
+            self.assertFalse(scenario._edge_exists.diagonal().any())
+            self.assertLess(self.solve_on(scenario, "greedy")['cost'], np.inf)
+
+    def test_sparse_scenario(self):
+        points = newPoints(60, 3)
+        for difficulty in ("Easy", "Normal"):
+            random.seed(9)
+            dense = Scenario(points, difficulty, 3)
+            random.seed(9)
+            sparse = TSPSparse.SparseScenario(points, difficulty, 3, neighbors=5)
+            pairs = np.indices((60, 60))
+            self.assertTrue(np.array_equal(sparse.pairCosts(pairs[0], pairs[1]), dense.costMatrix))
+            self.assertEqual(sparse.cost(4, 7), dense.costMatrix[4, 7])
+        sparse = TSPSparse.SparseScenario(points, "Hard (Deterministic)", 3, neighbors=5)
+        self.assertEqual(sparse.indptr[-1], len(sparse.indices))
+        for i in range(60):
+            row = slice(sparse.indptr[i], sparse.indptr[i + 1])
+            self.assertTrue(0 < row.stop - row.start <= 5)
+            self.assertTrue(np.array_equal(sparse.costs[row], sparse.pairCosts(i, sparse.indices[row])))
+            self.assertTrue(np.all(np.diff(sparse.costs[row]) >= 0))
+        solver = TSPSolver(None)
+        solver.setupWithScenario(sparse)
+        with self.assertRaises(ValueError):
+            solver.branchAndBound()
+        self.assertFalse(hasattr(solver, "greedyRoute"))
+        for algorithm in ("greedy", "fancy", "threeOpt"):
+            results = self.solve_on(sparse, algorithm, time_allowance=2.0)
+            self.assertEqual(sorted(city._index for city in results['soln'].route), list(range(60)))
+            self.assertEqual(results['soln'].cost, results['cost'])
+        serial = self.solve_on(sparse, "greedy", time_allowance=60.0)
+        parallel = self.solve_on(sparse, "greedy", time_allowance=60.0, workers=2)
+        self.assertEqual(parallel['starts'], serial['starts'])
+        self.assertEqual(parallel['cost'], serial['cost'])
+
+    def test_save_and_load(self):
+        scenario = newScenario(30, 4, "Hard")
+        cities = scenario.getCities()
+        with tempfile.TemporaryDirectory() as directory:
+            for cost_matrix, mmap in ((False, True), (True, True), (True, False)):
+                path = os.path.join(directory, "scenario.tsp")
+                scenario.save(path, cost_matrix=cost_matrix)
+                loaded = Scenario.load(path, mmap=mmap)
+                self.assertEqual(isinstance(loaded._cost_matrix, np.memmap), cost_matrix and mmap)
+                self.assertTrue(np.array_equal(loaded._edge_exists, scenario._edge_exists))
+                self.assertTrue(np.array_equal(loaded.costMatrix, scenario.costMatrix))
+                self.assertFalse(loaded.costMatrix.flags.writeable)
+                self.assertEqual([(c._x, c._y, c._elevation, c._name) for c in loaded.getCities()],
+                                 [(c._x, c._y, c._elevation, c._name) for c in cities])
+                del loaded
+            self.assertEqual(TSPBranchAndBound._shareable(Scenario.load(path).costMatrix)[0], path)
+            with self.assertRaises(ValueError):
+                Scenario.load(os.path.join(os.path.dirname(__file__), "README.md"))
+
+    def test_tsplib(self):
+        euclidean = TSPLib.parseTSPLIB(io.StringIO(
+            "NAME : square\nTYPE : TSP\nDIMENSION : 5\nEDGE_WEIGHT_TYPE : EUC_2D\nNODE_COORD_SECTION\n"
+            "1 0 0\n2 30 0\n3 30 40\n4 0 40\n5 15 60\nEOF\n"))
+        self.assertEqual(list(euclidean.costMatrix[0]), [np.inf, 30, 50, 40, 62])
+        self.assertEqual(euclidean.getCities()[0].costTo(euclidean.getCities()[4]), 62)
+        upper = TSPLib.parseTSPLIB(io.StringIO(
+            "NAME: up\nTYPE: TSP\nDIMENSION: 4\nEDGE_WEIGHT_TYPE: EXPLICIT\nEDGE_WEIGHT_FORMAT: UPPER_ROW\n"
+            "EDGE_WEIGHT_SECTION\n1 2 3\n4 5\n6\nEOF\n"))
+        self.assertEqual(upper.costMatrix[1].tolist(), [1, np.inf, 4, 5])
+        self.assertTrue(np.array_equal(upper.costMatrix, upper.costMatrix.T))
+        with self.assertRaises(ValueError):
+            TSPLib.parseTSPLIB(io.StringIO("NAME: g\nTYPE: TSP\nDIMENSION: 2\nEDGE_WEIGHT_TYPE: GEO\nEOF\n"))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "scenario.atsp")
+            TSPLib.writeTSPLIB(self.scenario, path)
+            scenario = TSPLib.readTSPLIB(path)
+            finite = np.isfinite(self.scenario.costMatrix)
+            self.assertTrue(np.array_equal(scenario.costMatrix[finite], self.scenario.costMatrix[finite]))
+            results = self.solve_on(scenario, "branchAndBound", time_allowance=60.0)
+            self.assertEqual(results['cost'], bruteForceCost(self.scenario))
+            tour = os.path.join(directory, "scenario.tour")
+            TSPLib.writeTour(results['soln'], tour)
+            self.assertEqual(TSPLib.readTour(tour), [city._index for city in results['soln'].route])
+
+            saved = os.path.join(directory, "scenario.tsp")
+            scenario.save(saved)
+            self.assertTrue(np.array_equal(Scenario.load(saved).costMatrix, scenario.costMatrix))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = TSPCache(directory)
+            key = TSPCache.key(15, 3, "Hard (Deterministic)")
+            scenario = cache.scenario(key)
+            self.assertIs(cache.scenario(key), scenario)
+            self.assertTrue(np.array_equal(scenario.costMatrix, newScenario(15, 3, "Hard (Deterministic)").costMatrix))
+            fancy = runOne("fancy", "Hard (Deterministic)", 15, 3, 5.0, cache=cache)
+            self.assertEqual(cache.bestTour(key)[0], fancy['cost'])
+            cold = runOne("branchAndBound", "Hard (Deterministic)", 15, 3, 60.0)
+            warm = runOne("branchAndBound", "Hard (Deterministic)", 15, 3, 60.0, cache=cache)
+            self.assertEqual(warm['cost'], cold['cost'])
+            self.assertLessEqual(warm['total'], cold['total'])
+
+            reloaded = TSPCache(directory)
+            self.assertTrue(np.array_equal(reloaded.scenario(key).costMatrix, scenario.costMatrix))
+            self.assertEqual((reloaded.diskHits, reloaded.misses), (1, 0))
+            self.assertEqual(reloaded.bestTour(key), cache.bestTour(key))
+            self.assertEqual(reloaded.bestTour(key, "branchAndBound")[0], cold['cost'])
+        self.assertEqual(key, TSPCache.key(15, 3, "Hard (Deterministic)", Scenario.LEGACY_GENERATOR_VERSION))
+        self.assertEqual(TSPCache.key(15, 3, "Hard"), TSPCache.key(15, 3, "Hard", Scenario.GENERATOR_VERSION))
+        self.assertNotEqual(TSPCache.key(15, 3, "Hard"), TSPCache.key(15, 3, "Hard", Scenario.LEGACY_GENERATOR_VERSION))
+
+    def test_warm_start(self):
+        self.solver.setupWithScenario(newScenario(16, 7, "Hard (Deterministic)"))
+        cold = self.solve("branchAndBound", time_allowance=60.0)
+        tour = [city._index for city in cold['soln'].route]
+        warm = self.solve("branchAndBound", time_allowance=60.0, initial_tour=tour)
+        self.assertEqual((warm['cost'], warm['count']), (cold['cost'], 0))
+        self.assertLess(warm['total'], cold['total'])
+        bounded = self.solve("branchAndBound", time_allowance=60.0, upper_bound=cold['cost'])
+        self.assertEqual(bounded['count'], 0)
+        self.assertEqual(bounded['total'], warm['total'])
+        rough = self.solve("branchAndBound", time_allowance=60.0, target_gap=0.5)
+        self.assertLessEqual(rough['gap'], 0.5)
+        self.assertLessEqual(rough['total'], cold['total'])
+        self.assertEqual((cold['bound'], cold['gap']), (cold['cost'], 0.0))
+        proof = self.solve("branchAndBound", time_allowance=60.0, initial_tour=tour, policy=TSPPolicies.BestFirst())
+        early = self.solve("branchAndBound", time_allowance=60.0, initial_tour=tour, policy=TSPPolicies.BestFirst(),
+                           target_gap=0.1)
+        self.assertLessEqual(early['gap'], 0.1)
+        self.assertLess(early['total'], proof['total'])
+        self.solver.setupWithScenario(newScenario(1, 7, "Hard"))
+        self.assertEqual(self.solve("branchAndBound")['gap'], np.inf)
+        for bad in ([0, 1], tour[:-1] + tour[:1], tour[:-1] + [16], tour[:-1] + [-1]):
+            with self.assertRaises(ValueError):
+                self.solve("branchAndBound", initial_tour=bad)
+
+    def test_branch_and_bound_optimal(self):
+        results = self.solve("branchAndBound", time_allowance=60.0)
+        self.assertEqual(results['cost'], bruteForceCost(self.scenario))
+        self.assertEqual(results['soln'].cost, results['cost'])
+
+    def test_parallel_branch_and_bound(self):
+        serial = self.solve("branchAndBound", time_allowance=60.0)
+        parallel = self.solve("branchAndBound", time_allowance=60.0, workers=2)
+        self.assertEqual(parallel['cost'], serial['cost'])
+
+    def test_delta_matrices(self):
+        full = self.solve("branchAndBound", time_allowance=60.0)
+        deltas = self.solve("branchAndBound", time_allowance=60.0, delta_matrices=True)
+        for key in ('cost', 'count', 'max', 'total', 'pruned'):
+            self.assertEqual(deltas[key], full[key])
+        root = TSPState([0], 0)
+        root.initMatrix(self.scenario)
+        root.reduceMatrix()
+        lazy, detached = (root.expand(3, lazy=True).expand(5, lazy=True) for i in range(2))
+        detached.detach(root)
+        detached = pickle.loads(pickle.dumps(detached))
+        lazy.materialize()
+        detached.materialize()
+        self.assertTrue(np.array_equal(detached.costMatrix, lazy.costMatrix))
+        self.solver.setupWithScenario(newScenario(13, 5, "Hard (Deterministic)"))
+        full = self.solve("branchAndBound", time_allowance=60.0, max_states=10)
+        spilled = self.solve("branchAndBound", time_allowance=60.0, max_states=10, delta_matrices=True)
+        self.assertGreater(spilled['spilled'], 0)
+        for key in ('cost', 'count', 'total', 'spilled'):
+            self.assertEqual(spilled[key], full[key])
+
+    def test_improvement_callback(self):
+        for algorithm in ("defaultRandomTour", "greedy", "branchAndBound", "fancy", "threeOpt",
+                          "simulatedAnnealing", "heldKarp"):
+            reported = []
+            results = self.solve(algorithm, time_allowance=2.0,
+                                 callback=lambda solution, progress: reported.append((solution.cost, progress)))
+            costs = [cost for cost, progress in reported]
+            self.assertEqual(costs[-1], results['cost'], algorithm)
+            self.assertEqual(costs, sorted(costs, reverse=True), algorithm)
+            for cost, progress in reported:
+                self.assertLessEqual(progress['bound'], cost)
+                self.assertGreaterEqual(progress['gap'], 0)
+        self.assertEqual(reported[-1][1]['gap'], 0)
+
+    def test_live_bound(self):
+        self.solver.setupWithScenario(newScenario(12, 5, "Hard (Deterministic)"))
+        for workers in (None, 2):
+            bounds = []
+            results = self.solve("branchAndBound", time_allowance=60.0, workers=workers,
+                                 callback=lambda solution, progress: bounds.append(progress['bound']))
+            self.assertEqual(bounds, sorted(bounds))
+            self.assertLessEqual(bounds[-1], results['cost'])
+            self.assertEqual((results['bound'], results['gap']), (results['cost'], 0.0))
+            if workers is None:
+                self.assertGreater(bounds[-1], bounds[0])
+        sparse = TSPSparse.SparseScenario(newPoints(30, 3), "Easy", 3, neighbors=5)
+        reported = []
+        self.solve_on(sparse, "greedy", callback=lambda solution, progress: reported.append(progress))
+        self.assertEqual((reported[-1]['bound'], reported[-1]['gap']), (None, None))
+
+    def test_callback_stops_search(self):
+        greedy = self.solve("greedy")
+        results = self.solve("branchAndBound", time_allowance=60.0, callback=lambda solution, progress: True)
+        self.assertEqual(results['cost'], greedy['cost'])
+        self.assertEqual(results['count'], 0)
+
+    def test_progress_stops_search(self):
+        self.solver.setupWithScenario(newScenario(40, 3, "Hard (Deterministic)"))
+        for algorithm in ("branchAndBound", "fancy", "threeOpt", "simulatedAnnealing"):
+            calls = []
+            results = self.solve(algorithm, time_allowance=60.0, progress=lambda stats: calls.append(stats) or True)
+            self.assertLess(results['time'], 10.0, algorithm)
+            self.assertLessEqual(len(calls), 1, algorithm)
+            self.assertLess(results['cost'], np.inf)
+
+    def test_progress_stops_greedy_phase(self):
+        self.solver.setupWithScenario(newScenario(1000, 3, "Hard (Deterministic)"))
+        results = self.solve("greedy", time_allowance=60.0, progress=lambda stats: True)
+        self.assertLess(len(results['starts']), 1000)
+        self.assertLess(results['cost'], np.inf)
+        for algorithm in ("fancy", "simulatedAnnealing"):
+            results = self.solve(algorithm, time_allowance=60.0, progress=lambda stats: True)
+            self.assertLess(results['time'], 2.0, algorithm)
+
+    def test_instrumentation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bb.pstats")
+            results = self.solve("branchAndBound", time_allowance=60.0, instrument=TSPInstrumentation(0.0), profile=path)
+            self.assertTrue(pstats.Stats(path).total_calls > 0)
+        report = results['instrument']
+        counters = report['counters']
+        self.assertEqual(counters['expand'], results['total'] - 1)
+        self.assertEqual(counters['reduce'], counters['expand'] - counters.get('pruned.infeasible', 0))
+        self.assertEqual(counters['pop'], counters['push'] + 1)
+        pruned = sum(n for name, n in counters.items() if name.startswith('pruned.') and name != 'pruned.leaf')
+        self.assertEqual(pruned, results['pruned'])
+        self.assertEqual(len(report['samples']), counters['pop'])
+        self.assertGreater(report['timers']['expand'], 0)
+
+    def test_search_policies(self):
+        optimal = bruteForceCost(self.scenario)
+        greedy = self.solve("greedy")['cost']
+        for policy in (TSPPolicies.DepthFirst(), TSPPolicies.BestFirst(), TSPPolicies.Hybrid()):
+            results = self.solve("branchAndBound", time_allowance=60.0, policy=policy)
+            self.assertEqual(results['cost'], optimal, type(policy).__name__)
+        beam = self.solve("branchAndBound", time_allowance=60.0, policy=TSPPolicies.Beam(2))
+        self.assertTrue(optimal <= beam['cost'] <= greedy)
+        self.assertLessEqual(beam['max'], 2 * 8)
+        parallel = self.solve("branchAndBound", time_allowance=60.0, workers=2, policy=TSPPolicies.BestFirst())
+        self.assertEqual(parallel['cost'], optimal)
+
+    def test_greedy_every_start(self):
+        results = self.solve("greedy", time_allowance=60.0)
+        starts = dict(results['starts'])
+        self.assertEqual(sorted(starts.keys()), list(range(8)))
+        self.assertEqual(results['cost'], min(starts.values()))
+        self.assertEqual(results['count'], len([c for c in starts.values() if c < np.inf]))
+        self.assertEqual(sorted(city._index for city in results['soln'].route), list(range(8)))
+
+    def test_parallel_greedy(self):
+        serial = self.solve("greedy", time_allowance=60.0)
+        parallel = self.solve("greedy", time_allowance=60.0, workers=2)
+        self.assertEqual(sorted(parallel['starts']), sorted(serial['starts']))
+        self.assertEqual(parallel['cost'], serial['cost'])
+
+    def test_fancy_local_search(self):
+        greedy = self.solve("greedy", time_allowance=60.0)
+        results = self.solve("fancy", time_allowance=60.0)
+        self.assertLessEqual(results['cost'], greedy['cost'])
+        self.assertGreaterEqual(results['cost'], bruteForceCost(self.scenario))
+        self.assertEqual(sorted(city._index for city in results['soln'].route), list(range(8)))
+
+    def test_local_search_bookkeeping(self):
+        matrix = newScenario(60, 4, "Hard (Deterministic)").costMatrix
+        costs = penalizedCosts(matrix)
+        for search in (TSPLocalSearch(matrix, list(range(60))), TSPThreeOpt(matrix, list(range(60)), seed=2)):
+            if isinstance(search, TSPThreeOpt):
+                route = search.solve(time.time() + 0.5)
+            else:
+                route = search.improve(time.time() + 10.0)
+            self.assertEqual(sorted(route), list(range(60)))
+            self.assertEqual(search.cost(), sum(costs[a][b] for a, b in zip(route, route[1:] + route[:1])))
+            self.assertEqual([search.pos[city] for city in route], list(range(60)))
+            for start, count in ((0, 60), (5, 20), (50, 30)):
+                edges = [(route[m % 60], route[(m + 1) % 60]) for m in range(start, start + count)]
+                self.assertEqual(search._reverseSum(start, count), sum(costs[b][a] - costs[a][b] for a, b in edges))
+
+    def test_three_opt(self):
+        fancy = self.solve("fancy", time_allowance=60.0)
+        results = self.solve("threeOpt", time_allowance=0.5, seed=1)
+        self.assertLessEqual(results['cost'], fancy['cost'])
+        self.assertGreaterEqual(results['cost'], bruteForceCost(self.scenario))
+        self.assertGreater(results['total'], 0)
+
+    def test_simulated_annealing(self):
+        greedy = self.solve("greedy", time_allowance=60.0)
+        for schedule in (None, LinearCooling(100.0, 0.1)):
+            results = self.solve("simulatedAnnealing", time_allowance=0.5, schedule=schedule, seed=1)
+            self.assertLessEqual(results['cost'], greedy['cost'])
+            self.assertGreaterEqual(results['cost'], bruteForceCost(self.scenario))
+            self.assertEqual(sorted(city._index for city in results['soln'].route), list(range(8)))
+            self.assertEqual(results['accepted'] + results['rejected'], results['total'])
+            self.assertGreater(results['accepted'], 0)
+        matrix = newScenario(60, 4, "Hard (Deterministic)").costMatrix
+        costs = penalizedCosts(matrix)
+        search = TSPAnnealing(matrix, list(range(60)), seed=3)
+        route = search.anneal(time.time() + 0.3)
+        self.assertEqual(sorted(route), list(range(60)))
+        self.assertEqual(search.bestCost, sum(costs[a][b] for a, b in zip(route, route[1:] + route[:1])))
+        self.assertLess(search.bestCost, sum(costs[a][(a + 1) % 60] for a in range(60)))
+
+    def test_held_karp(self):
+        results = self.solve("heldKarp", time_allowance=60.0)
+        self.assertEqual(results['cost'], bruteForceCost(self.scenario))
+        self.assertEqual(results['soln'].cost, results['cost'])
+        with self.assertRaises(ValueError):
+            self.solve("heldKarp", max_cities=7)
+        with self.assertRaises(ValueError):
+            self.solve("heldKarp", max_memory=1024)
+        costMatrix = np.random.default_rng(1).integers(1, 100, (14, 14)).astype(float)
+        tracemalloc.start()
+        TSPHeldKarp.heldKarp(costMatrix)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertGreaterEqual(TSPHeldKarp.memoryEstimate(14), peak)
+
+    def test_lagrangian_bound(self):
+        optimal = bruteForceCost(self.scenario)
+        reduced = TSPState([0], 0)
+        reduced.initMatrix(self.scenario)
+        reduced.reduceMatrix(TSPBounds.ReductionBound())
+        lagrangian = TSPState([0], 0)
+        lagrangian.initMatrix(self.scenario)
+        gain = lagrangian.reduceMatrix(TSPBounds.LagrangianBound(50))
+        self.assertEqual(gain, lagrangian.bestCost)
+        self.assertLessEqual(reduced.bestCost, lagrangian.bestCost)
+        self.assertLessEqual(lagrangian.bestCost, optimal)
+        self.assertTrue((lagrangian.costMatrix >= 0).all())
+
+        results = self.solve("branchAndBound", time_allowance=60.0, lower_bound=TSPBounds.LagrangianBound())
+        self.assertEqual(results['cost'], optimal)
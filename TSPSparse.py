@@ -0,0 +1,441 @@
+#!/usr/bin/python3
+
+import math
+import random
+import time
+import multiprocessing
+import numpy as np
+from TSPClasses import City, Scenario, nameForInt
+
+
+
+''' <summary>
+	Uniform grid over the city coordinates, about per_cell cities per cell.  Cell ids
+	are x * ny + y, so the cells of one grid column within a range of rows are
+	consecutive ids and their cities one slice of the sorted order.
+	</summary>
+'''
+
+class GridIndex:
+	def __init__( self, xs, ys, per_cell=2 ):
+		n = len(xs)
+		self.x0, self.y0 = float(xs.min()), float(ys.min())
+		width = max( float(xs.max()) - self.x0, 1e-9 )
+		height = max( float(ys.max()) - self.y0, 1e-9 )
+		self.size = max( math.sqrt(width * height * per_cell / n), max(width, height) * per_cell / n )
+		self.nx = int(width // self.size) + 1
+		self.ny = int(height // self.size) + 1
+		self.cx = np.minimum( ((xs - self.x0) / self.size).astype(np.intp), self.nx - 1 )
+		self.cy = np.minimum( ((ys - self.y0) / self.size).astype(np.intp), self.ny - 1 )
+		self.cellOf = self.cx * self.ny + self.cy
+		self.order = np.argsort( self.cellOf, kind='stable' )
+		self.starts = np.searchsorted( self.cellOf[self.order], np.arange(self.nx * self.ny + 1) )
+
+	def members( self, cell ):
+		return self.order[self.starts[cell]:self.starts[cell + 1]]
+
+	''' <summary>
+		The cities in the square of cells within r cells of (cx, cy).
+		</summary>
+	'''
+	def square( self, cx, cy, r ):
+		ylo, yhi = max(cy - r, 0), min(cy + r, self.ny - 1)
+		slices = [self.order[self.starts[x*self.ny + ylo]:self.starts[x*self.ny + yhi + 1]]
+				  for x in range( max(cx - r, 0), min(cx + r, self.nx - 1) + 1 )]
+		return np.concatenate( slices )
+
+	''' <summary>
+		The cells exactly r cells (Chebyshev) away from (cx, cy) that lie in the grid.
+		</summary>
+	'''
+	def ring( self, cx, cy, r ):
+		if r == 0:
+			return [cx * self.ny + cy]
+		cells = []
+		for x in range( cx - r, cx + r + 1 ):
+			if 0 <= x < self.nx:
+				for y in ((cy - r, cy + r) if abs(x - cx) < r else range(cy - r, cy + r + 1)):
+					if 0 <= y < self.ny:
+						cells.append( x * self.ny + y )
+		return cells
+
+	''' <summary>
+		The k nearest cities (Euclidean) of every city, nearest first, one cell of
+		cities at a time: grow the square around the cell until it holds k others for
+		everyone, then widen it to the k-th distance so that nothing closer is missed.
+		</summary>
+		<returns>an (n x k) array of city indices</returns>
+	'''
+	def nearest( self, xs, ys, k ):
+		n = len(xs)
+		result = np.empty( (n, k), dtype=np.intp )
+		for cell in np.flatnonzero( np.diff(self.starts) ):
+			members = self.members( cell )
+			cx, cy = divmod( int(cell), self.ny )
+			r = 1
+			pool = self.square( cx, cy, r )
+			while len(pool) <= k and len(pool) < n:
+				r += 1
+				pool = self.square( cx, cy, r )
+			d = self._distances( xs, ys, members, pool )
+			reach = int( math.sqrt(np.partition(d, k - 1, axis=1)[:, k - 1].max()) / self.size ) + 1
+			if reach > r:
+				pool = self.square( cx, cy, reach )
+				d = self._distances( xs, ys, members, pool )
+			best = np.argpartition( d, k - 1, axis=1 )[:, :k]
+			best = np.take_along_axis( best, np.take_along_axis(d, best, axis=1).argsort(axis=1, kind='stable'), axis=1 )
+			result[members] = pool[best]
+		return result
+
+	@staticmethod
+	def _distances( xs, ys, members, pool ):
+		d = (xs[pool][np.newaxis, :] - xs[members][:, np.newaxis])**2 + \
+			(ys[pool][np.newaxis, :] - ys[members][:, np.newaxis])**2
+		d[pool[np.newaxis, :] == members[:, np.newaxis]] = np.inf
+		return d
+
+
+
+_MASK = 2**64 - 1
+_GOLDEN, _MIX1, _MIX2 = 0x9E3779B97F4A7C15, 0xBF58476D1CE4E5B9, 0x94D049BB133111EB
+
+''' <summary>
+	splitmix64 of (seed, i * n + j) as a float in [0, 1), vectorized and scalar
+	versions giving identical values.
+	</summary>
+'''
+
+def _edgeHash( seedMix, src, dst, n ):
+	with np.errstate( over='ignore' ):
+		z = src.astype(np.uint64) * np.uint64(n) + dst.astype(np.uint64) + np.uint64(seedMix)
+		z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+		z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+		z = z ^ (z >> np.uint64(31))
+	return (z >> np.uint64(11)).astype(np.float64) * 2.0**-53
+
+def _edgeHashScalar( seedMix, i, j, n ):
+	z = (i * n + j + seedMix) & _MASK
+	z = ((z ^ (z >> 30)) * _MIX1) & _MASK
+	z = ((z ^ (z >> 27)) * _MIX2) & _MASK
+	z = z ^ (z >> 31)
+	return (z >> 11) * 2.0**-53
+
+
+
+''' <summary>
+	A scenario for instances too large for a dense cost matrix (50,000 cities would
+	need 20 GB of float64).  It stores only coordinates and elevations, computes any
+	edge's cost on demand with the same arithmetic as Scenario.costMatrix, and keeps
+	each city's k cheapest edges as a candidate graph in CSR form (indptr, indices,
+	costs) found with a GridIndex instead of comparing every pair.  With elevations the
+	k cheapest are chosen among the 2k nearest, so the candidate graph is a heuristic.
+
+	Hard modes cannot record which of the n^2 edges were removed, so an edge (i, j) is
+	missing when a hash of (seed, i, j) falls below HARD_MODE_FRACTION_TO_REMOVE,
+	except the edges of one random tour kept aside as in Scenario.thinEdges.  Cities
+	lose the same fraction of edges on average, but the graphs are not the ones
+	Scenario builds for the same seed.  "Hard (Deterministic)" hashes with rand_seed.
+
+	Heuristic solvers take it in place of a Scenario: TSPSolver.greedy, fancy,
+	threeOpt and defaultRandomTour.  Solvers that need the dense matrix get a
+	ValueError from costMatrix.
+	</summary>
+'''
+
+class SparseScenario:
+	HARD_MODE_FRACTION_TO_REMOVE = Scenario.HARD_MODE_FRACTION_TO_REMOVE
+	NEIGHBORS = 10
+
+	def __init__( self, city_locations, difficulty, rand_seed, neighbors=NEIGHBORS ):
+		self._difficulty = difficulty
+		self._rand_seed = rand_seed
+		locations = np.array( Scenario.coordinates(city_locations), dtype=float ).reshape(-1, 2)
+		n = len(locations)
+		self._xs = locations[:, 0].copy()
+		self._ys = locations[:, 1].copy()
+		if difficulty == "Normal" or difficulty == "Hard":
+			self._elevations = np.array( [random.uniform(0.0,1.0) for i in range(n)] )
+		elif difficulty == "Hard (Deterministic)":
+			random.seed( rand_seed )
+			self._elevations = np.array( [random.uniform(0.0,1.0) for i in range(n)] )
+		else:
+			self._elevations = np.zeros( n )
+		self._easy = difficulty == 'Easy'
+		self._xl, self._yl, self._el = self._xs.tolist(), self._ys.tolist(), self._elevations.tolist()
+
+		self._hard = difficulty == "Hard" or difficulty == "Hard (Deterministic)"
+		self._keep = None
+		self._seedMix = 0
+		if self._hard:
+			seed = rand_seed if difficulty == "Hard (Deterministic)" else int(np.random.randint(2**31))
+			self._seedMix = (seed * _GOLDEN) & _MASK
+			route_keep = np.random.RandomState( seed ).permutation( n )
+			self._keep = np.empty( n, dtype=np.intp )
+			self._keep[route_keep] = np.roll( route_keep, -1 )
+			self._keepList = self._keep.tolist()
+
+		diagonal = math.hypot( float(np.ptp(self._xs)) if n else 0.0, float(np.ptp(self._ys)) if n else 0.0 )
+		self._penalty = (math.ceil((diagonal + 1.0) * City.MAP_SCALE) + 1) * max(n, 1)
+		self.grid = GridIndex( self._xs, self._ys ) if n > 1 else None
+		self.indptr, self.indices, self.costs = self._buildCandidates( min(neighbors, n - 1) )
+		self._cities = None
+
+	def __len__( self ):
+		return len(self._xs)
+
+	def getCities( self ):
+		if self._cities is None:
+			self._cities = []
+			for i in range(len(self._xs)):
+				city = City( self._xl[i], self._yl[i], self._el[i] )
+				city.setScenario( self )
+				city.setIndexAndName( i, nameForInt( i+1 ) )
+				self._cities.append( city )
+		return self._cities
+
+	@property
+	def costMatrix( self ):
+		raise ValueError( 'A sparse scenario of {} cities has no dense cost matrix; use a heuristic solver'.format(len(self)) )
+
+	''' <summary>
+		Whether the edges src -> dst exist (arrays of the same shape).
+		</summary>
+	'''
+	def edgeExists( self, src, dst ):
+		exists = src != dst
+		if self._hard:
+			kept = self._keep[src] == dst
+			exists &= kept | (_edgeHash(self._seedMix, src, dst, len(self)) >= self.HARD_MODE_FRACTION_TO_REMOVE)
+		return exists
+
+	''' <summary>
+		Costs of the edges src -> dst, exactly the entries Scenario.costMatrix would
+		hold for the same cities (np.inf for missing edges).
+		</summary>
+	'''
+	def pairCosts( self, src, dst ):
+		src, dst = np.broadcast_arrays( np.asarray(src, dtype=np.intp), np.asarray(dst, dtype=np.intp) )
+		cost = np.sqrt( (self._xs[dst] - self._xs[src])**2 + (self._ys[dst] - self._ys[src])**2 )
+		if not self._easy:
+			cost += self._elevations[dst] - self._elevations[src]
+			cost = np.where( cost < 0.0, 0.0, cost )
+		cost = np.ceil( cost * City.MAP_SCALE )
+		return np.where( self.edgeExists(src, dst), cost, np.inf )
+
+	''' <summary>
+		Cost of one edge with plain floats, for the inner loops of the heuristics.
+		</summary>
+	'''
+	def cost( self, i, j ):
+		if i == j:
+			return math.inf
+		if self._hard and self._keepList[i] != j and \
+		   _edgeHashScalar(self._seedMix, i, j, len(self._xl)) < self.HARD_MODE_FRACTION_TO_REMOVE:
+			return math.inf
+		dx = self._xl[j] - self._xl[i]
+		dy = self._yl[j] - self._yl[i]
+		cost = math.sqrt( dx*dx + dy*dy )
+		if not self._easy:
+			cost += self._el[j] - self._el[i]
+			if cost < 0.0:
+				cost = 0.0
+		return float( math.ceil(cost * City.MAP_SCALE) )
+
+	def legCosts( self, indices ):
+		return self.pairCosts( indices, np.roll(indices, -1) )
+
+	def tourCosts( self, tours ):
+		tours = np.asarray( tours, dtype=np.intp )
+		if tours.ndim == 1:
+			tours = tours[np.newaxis, :]
+		return self.pairCosts( tours, np.roll(tours, -1, axis=1) ).sum( axis=1 )
+
+	def _buildCandidates( self, k ):
+		n = len(self)
+		if k <= 0:
+			return np.zeros( n + 1, dtype=np.int64 ), np.zeros( 0, dtype=np.int32 ), np.zeros( 0 )
+		near = self.grid.nearest( self._xs, self._ys, k if self._easy else min(2*k, n - 1) )
+		costs = self.pairCosts( np.arange(n)[:, np.newaxis], near )
+		order = np.argsort( costs, axis=1, kind='stable' )[:, :k]
+		near = np.take_along_axis( near, order, axis=1 )
+		costs = np.take_along_axis( costs, order, axis=1 )
+		keep = np.isfinite( costs )
+		indptr = np.zeros( n + 1, dtype=np.int64 )
+		np.cumsum( keep.sum(axis=1), out=indptr[1:] )
+		return indptr, near[keep].astype(np.int32), costs[keep]
+
+	''' <summary>
+		Candidate lists for local search: every city's cheapest k destinations, or with
+		incoming its cheapest sources among the candidate edges, cheapest first.
+		</summary>
+	'''
+	def candidateLists( self, k=None, incoming=False ):
+		n = len(self)
+		sources = np.repeat( np.arange(n), np.diff(self.indptr) )
+		rank = np.arange( len(self.indices) ) - self.indptr[sources]
+		if k is not None:
+			sources, targets, costs = sources[rank < k], self.indices[rank < k], self.costs[rank < k]
+		else:
+			targets, costs = self.indices, self.costs
+		if incoming:
+			sources, targets = targets, sources
+		order = np.lexsort( (costs, sources) )
+		bounds = np.searchsorted( sources[order], np.arange(n + 1) )
+		targets = targets[order].tolist()
+		return [targets[bounds[i]:bounds[i+1]] for i in range(n)]
+
+	''' <summary>
+		Cost rows for TSPLocalSearch: costs[a][b] with missing edges replaced by a
+		penalty larger than any tour of real edges, as TSPLocalSearch.penalizedCosts.
+		Each row is a dict built once from the city's CSR candidate edges, so the
+		candidate lookups of the local search's inner loops are dict hits; any other
+		edge is computed on lookup (see _PenalizedRow).
+		</summary>
+	'''
+	def penalizedCosts( self ):
+		indices, costs = self.indices.tolist(), self.costs.tolist()
+		bounds = self.indptr.tolist()
+		return [_PenalizedRow( self, i, zip(indices[bounds[i]:bounds[i+1]], costs[bounds[i]:bounds[i+1]]) )
+				for i in range(len(self))]
+
+	def penalizedPairCosts( self, src, dst ):
+		costs = self.pairCosts( src, dst )
+		return np.where( costs == np.inf, float(self._penalty), costs )
+
+
+class _PenalizedRow( dict ):
+	__slots__ = ('_scenario', '_i')
+
+	def __init__( self, scenario, i, candidates ):
+		super().__init__( candidates )
+		self._scenario = scenario
+		self._i = i
+
+	def __missing__( self, j ):
+		cost = self._scenario.cost( self._i, j )
+		return cost if cost != math.inf else self._scenario._penalty
+
+
+
+''' <summary>
+	Nearest neighbor tour over the candidate graph.  When every candidate of the
+	current city is already in the route, the grid is searched ring by ring around it
+	for unvisited cities (one ring past the first that has any), and the cheapest
+	existing edge among them is taken.
+	</summary>
+	<returns>(cost, route as a list of city indices), or (np.inf, None) if the walk gets
+	stuck or cannot close the cycle</returns>
+'''
+
+def greedyTour( scenario, start, neighbors=None ):
+	n = len(scenario)
+	if neighbors is None:
+		neighbors = scenario.candidateLists()
+	grid = scenario.grid
+	cellOf = grid.cellOf.tolist() if grid is not None else [0]
+	remaining = np.bincount( grid.cellOf, minlength=grid.nx * grid.ny ).tolist() if grid is not None else [n]
+	visited = bytearray(n)
+	def visit( city ):
+		visited[city] = 1
+		remaining[cellOf[city]] -= 1
+	visit( start )
+	route = [start]
+	cost = 0
+	current = start
+	while len(route) < n:
+		next = None
+		for city in neighbors[current]:
+			if not visited[city]:
+				next = city
+				break
+		if next is None:
+			next = _nearestUnvisited( scenario, current, visited, remaining )
+			if next is None:
+				return np.inf, None
+		cost += scenario.cost( current, next )
+		visit( next )
+		route.append( next )
+		current = next
+	closing = scenario.cost( current, start )
+	if closing == math.inf:
+		return np.inf, None
+	return int(cost + closing), route
+
+def _nearestUnvisited( scenario, current, visited, remaining ):
+	grid = scenario.grid
+	cx, cy = int(grid.cx[current]), int(grid.cy[current])
+	best, bestCost = None, math.inf
+	lastRing = max( grid.nx, grid.ny )
+	r = 0
+	while r <= lastRing:
+		for cell in grid.ring( cx, cy, r ):
+			if remaining[cell] > 0:
+				for city in grid.members( cell ).tolist():
+					if not visited[city]:
+						cost = scenario.cost( current, city )
+						if cost < bestCost:
+							best, bestCost = city, cost
+		if best is not None and lastRing > r + 1:
+			lastRing = r + 1												# one more ring can still hold a cheaper city
+		r += 1
+	return best
+
+
+PROGRESS_INTERVAL = 0.25											# seconds between bestGreedyTour's onProgress calls
+GREEDY_SHARE = 0.1		# of fancy and threeOpt's time allowance spent on starting tours, seconds each at 50,000 cities
+
+''' <summary>
+	Nearest neighbor tours from start cities 0, 1, 2, ... until the deadline, keeping
+	the cheapest; the same interface as TSPGreedy.bestGreedyTour, except that
+	onProgress gets the (start, cost) pairs so far and is checked between tours.  With
+	workers > 1 the starts are spread over a process pool, each worker with its own
+	copy of the scenario, and the pool is terminated at the deadline.
+	</summary>
+	<returns>(best cost, best route or None, list of (start, cost) for every start tried)</returns>
+'''
+
+def bestGreedyTour( scenario, deadline, onProgress=None, workers=None ):
+	best = [np.inf, None]
+	starts = []
+	def record( start, cost, route ):
+		starts.append( (start, cost) )
+		if cost < best[0]:
+			best[:] = [cost, route]
+	def stop( now ):
+		nonlocal nextProgress
+		if starts and now >= deadline:
+			return True
+		if starts and onProgress is not None and now >= nextProgress:
+			nextProgress = now + PROGRESS_INTERVAL
+			return bool(onProgress( starts ))
+		return False
+	nextProgress = time.time() + PROGRESS_INTERVAL
+	if workers is not None and workers > 1:
+		with multiprocessing.Pool( workers, initializer=_initWorker, initargs=(scenario,) ) as pool:
+			pending = pool.imap_unordered( _greedyFrom, range(len(scenario)) )
+			while len(starts) < len(scenario) and not stop( time.time() ):
+				try:
+					record( *pending.next(PROGRESS_INTERVAL) )
+				except multiprocessing.TimeoutError:
+					pass
+		starts.sort()
+	else:
+		neighbors = scenario.candidateLists()
+		for start in range(len(scenario)):
+			if stop( time.time() ):
+				break
+			record( start, *greedyTour(scenario, start, neighbors) )
+	return best[0], best[1], starts
+
+
+
+_workerScenario = None
+_workerNeighbors = None
+
+def _initWorker( scenario ):
+	global _workerScenario, _workerNeighbors
+	_workerScenario = scenario
+	_workerNeighbors = scenario.candidateLists()
+
+def _greedyFrom( start ):
+	return (start,) + greedyTour( _workerScenario, start, _workerNeighbors )
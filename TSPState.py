@@ -2,37 +2,50 @@ import numpy as np
 from TSPClasses import *
 import itertools
 
+"""
+    A branch and bound state. The path is kept as a small array of city indices with a matching bitmask of the 
+    visited cities, and the state holds no reference to the scenario, so a queue of states only pays for the 
+    cost matrices. The matrices may be float32 instead of float64 to halve that; they have to stay floating 
+    point because covered rows, columns and missing edges are stored as infinity. A child created with 
+    expand(city, lazy=True) holds no matrix of its own, only its parent's matrix and the few row and column 
+    reductions that differ (delta), until materialize() builds it; detach(root) drops even those, to spill it.
+"""
 class TSPState:
-    def __init__(self, path, cities, bestCost):
-        super().__init__()
+    __slots__ = ('bestCost', 'path', 'visited', 'costMatrix', 'delta')
+
+    PATH_DTYPE = np.int32
+
+    def __init__(self, path, bestCost, costMatrix=None, visited=None):
         self.bestCost = bestCost
-        self.path = path
-        self.cities = cities
+        self.path = np.asarray(path, dtype=self.PATH_DTYPE)
+        if visited is None:
+            visited = 0
+            for city in self.path:
+                visited |= 1 << int(city)
+        self.visited = visited
+        self.costMatrix = costMatrix
+        self.delta = None
     """
         comparison function used by the heapq library. Initially compares the path length, choosing the longer path. 
-        If the paths are the same length, then the current cost is used to compare heap values
+        If the paths are the same length, then the current cost is used to compare heap values. TSPFrontier orders 
+        states by a TSPPolicies key instead; this is the same order as TSPPolicies.DepthFirst.
         O(1) 
     """
     def __lt__(self, value):
-        if len(self.path) is not len(value.path):
+        if len(self.path) != len(value.path):
             return len(self.path) > len(value.path)
         else:
             return self.bestCost < value.bestCost
     
     """         
-        Initializes cost matrix to the costs between cities.
+        Initializes cost matrix to the costs between cities, copied from the scenario's precomputed matrix. 
+        dtype may be any floating point type; float32 is exact for the integer costs of any realistic tour.
         O(n^2)
     """    
-    def initMatrix(self):
-        self.costMatrix = np.zeros(shape=(len(self.cities), len(self.cities)))
-        row_index = 0
-        col_index = 0
-        for fromCity in self.cities:
-            col_index = 0
-            for toCity in self.cities:
-                self.costMatrix[row_index][col_index] = fromCity.costTo(toCity)
-                col_index += 1
-            row_index += 1
+    def initMatrix(self, scenario, dtype=np.float64):
+        if not np.issubdtype(dtype, np.floating):
+            raise ValueError('TSPState cost matrices must be floating point to hold np.inf, not {}'.format(np.dtype(dtype)))
+        self.costMatrix = np.array(scenario.costMatrix, dtype=dtype)
     
     def __str__(self):
         return str(self.costMatrix)
@@ -40,12 +53,106 @@ class TSPState:
     def len(self):
         return len(self.path)
     
+    """
+        Checks the visited bitmask for a city index
+        O(1)
+    """
     def inPath(self, city):
-        for val in self.path:
-            if val._index == city._index:
-                return True
-        return False
+        return (self.visited >> city) & 1 == 1
+
+    """
+        Creates the child state that extends this path to a city: copies the cost matrix, covers the new edge and 
+        reduces the copy with the given bound (see TSPBounds).
+        
+        With lazy (and the default reduction) the child gets its bound without a matrix. This state's matrix is fully 
+        reduced, so covering row i, column j and cell (j, i) can only take the last zero out of row j and the rows 
+        with a zero in column j, and out of column i and the columns with a zero in row i; only those are re-reduced 
+        and the child keeps them as a delta against this matrix. The bound is identical to a full reduction, and 
+        materialize() rebuilds the identical matrix when the child is expanded.
+        O(n^2), or O(n*k) if lazy, where k is the number of rows and columns re-reduced
+    """
+    def expand(self, city, bound=None, lazy=False):
+        self.materialize()
+        fromCity = int(self.path[-1])
+        child = TSPState(np.append(self.path, city), self.bestCost, None, self.visited | (1 << city))
+        if bound is not None or not lazy:
+            child.costMatrix = np.copy(self.costMatrix)
+            child.coverCities(fromCity, city)
+            child.reduceMatrix(bound)
+            return child
+        child.bestCost += float(self.costMatrix[fromCity][city])
+        child.delta = self.childReductions(fromCity, city, child.bestCost != np.inf)
+        child.bestCost += float(child.delta[4].sum(dtype=np.float64))
+        child.bestCost += float(child.delta[6].sum(dtype=np.float64))
+        return child
+
+    """
+        The row and column reductions the child that covers (fromCity, toCity) needs, computed from this state's 
+        matrix without copying it.
+        O(n*k)
+    """
+    def childReductions(self, fromCity, toCity, covered=True):
+        matrix = self.costMatrix
+        if not covered:
+            none = np.zeros(0, dtype=np.intp)
+            return (matrix, fromCity, toCity, none, none, none, none)
+        rows = matrix[:, toCity] == 0
+        rows[toCity] = True
+        rows[fromCity] = False
+        rows = np.flatnonzero(rows)
+        block = matrix[rows]
+        block[:, toCity] = np.inf
+        block[rows == toCity, fromCity] = np.inf
+        rowMins = block.min(axis=1)
+        rowMins[rowMins == np.inf] = 0                                  # rows left without a finite entry stay as they are
+
+        cols = matrix[fromCity] == 0
+        cols[fromCity] = True
+        cols[toCity] = False
+        cols = np.flatnonzero(cols)
+        block = matrix[:, cols]
+        block[fromCity] = np.inf
+        block[toCity, cols == fromCity] = np.inf
+        block[rows] -= rowMins[:, np.newaxis]
+        colMins = block.min(axis=0)
+        colMins[colMins == np.inf] = 0
+        return (matrix, fromCity, toCity, rows, rowMins, cols, colMins)
+
+    """
+        Builds the cost matrix of a lazily expanded state from its parent's matrix and its delta, or of a detached
+        state by expanding its root along the rest of the path
+        O(n^2), or O(d*n^2) for a detached state d cities below its root
+    """
+    def materialize(self):
+        if self.delta is None:
+            return
+        if isinstance(self.delta, TSPState):
+            state = self.delta
+            for city in self.path[state.len():]:
+                state = state.expand(int(city))
+            self.costMatrix = state.costMatrix
+            self.delta = None
+            return
+        matrix, fromCity, toCity, rows, rowMins, cols, colMins = self.delta
+        self.costMatrix = np.copy(matrix)
+        if self.bestCost != np.inf:
+            self.infRow(fromCity)
+            self.infCol(toCity)
+            self.infPair(fromCity, toCity)
+            self.costMatrix[rows] -= rowMins[:, np.newaxis]
+            self.costMatrix[:, cols] -= colMins[np.newaxis, :]
+        self.delta = None
     
+    """
+        Replaces a lazy state's delta, and with it the reference to its parent's matrix, by root, an ancestor that
+        holds its own matrix, so that it pickles as little more than its path and bound. A lazy child's matrix is
+        the one a full expansion gives (see expand), so materialize() rebuilds the same one by expanding root.
+        O(1)
+    """
+    def detach(self, root):
+        if self.delta is not None:
+            self.delta = root
+
     def setMatrix(self, matrix):
         self.costMatrix = matrix
 
@@ -55,7 +162,7 @@ class TSPState:
         O(2n + 1)
     """
     def coverCities(self, fromCity, toCity):
-        self.bestCost += self.costMatrix[fromCity][toCity]
+        self.bestCost += float(self.costMatrix[fromCity][toCity])
         if self.bestCost != np.inf:
             self.infRow(fromCity)
             self.infCol(toCity)
@@ -63,103 +170,82 @@ class TSPState:
 
     """
         Performs row and column reduction operations on the cost matrix. If best cost is infinity, this operation is skipped because 
-        the best cost will still be infinity, meaning the state will never enter the queue anyways
-        O(kn^2) # where k is the number of cities
+        the best cost will still be infinity, meaning the state will never enter the queue anyways. Returns the amount the reduction 
+        added to bestCost. bound is any TSPBounds bound; the default is the row and column reduction.
+        O(n^2) # as two whole-matrix NumPy passes
     """
-    def reduceMatrix(self):
-        if self.bestCost != np.inf:
-            self.reduceMatrixRows()
-            self.reduceMatrixCols()
+    def reduceMatrix(self, bound=None):
+        if self.bestCost == np.inf:
+            return 0
+        if bound is not None:
+            return bound.reduce(self)
+        return self.reduceMatrixRows() + self.reduceMatrixCols()
     """
         Performs a row reduction on every row by subtracting the minimum row value from every value in the row. This function also increments the bestCost 
-        value. Operation is skipped if min value is 0 or infinity, due to the redundancy of such an operation. 
-        O(kn + k) #  where k is the number of cities
+        value. Rows whose min value is 0 or infinity are left alone, due to the redundancy of such an operation. 
+        O(n^2) # one NumPy min and one subtract over the matrix
     """
     def reduceMatrixRows(self):
-        for row in range(len(self.costMatrix)):
-            min, minIndex = self.findRowMin(row)
-            if min != np.inf and min > 0:
-                self.reduceRow(row, min, minIndex)
-                self.bestCost += min
+        mins = self.costMatrix.min(axis=1)
+        rows = np.isfinite(mins) & (mins > 0)
+        self.costMatrix[rows] -= mins[rows, np.newaxis]
+        reduction = float(mins[rows].sum(dtype=np.float64))
+        self.bestCost += reduction
+        return reduction
     """
         Performs a col reduction by subtracting the minimum col value from every value in the col. This function also increments the bestCost 
-        value. Operation is skipped if min value is 0 or infinity, due to the redundancy of such an operation. 
-        O(kn + k) #  where k is the number of cities
+        value. Cols whose min value is 0 or infinity are left alone, due to the redundancy of such an operation. 
+        O(n^2) # one NumPy min and one subtract over the matrix
     """
     def reduceMatrixCols(self):
-        for col in range(len(self.costMatrix[0])):
-            min, minIndex = self.findColMin(col)
-            if min != np.inf and min > 0:
-                self.reduceCol(col, min, minIndex)
-                self.bestCost += min
+        mins = self.costMatrix.min(axis=0)
+        cols = np.isfinite(mins) & (mins > 0)
+        self.costMatrix[:, cols] -= mins[np.newaxis, cols]
+        reduction = float(mins[cols].sum(dtype=np.float64))
+        self.bestCost += reduction
+        return reduction
     """
         This function actually performs the row reduction, subtracting the min value from the row
         O(n)
     """
     def reduceRow(self, row, min, minIndex):
-        for col in range(len(self.costMatrix[row])):
-            newCost = self.costMatrix[row][col] - min
-            if newCost == np.nan:
-                self.costMatrix[row][col] = np.inf
-            else:
-                self.costMatrix[row, col] = newCost
+        self.costMatrix[row] -= min
     """
         This function actually performs the column reduction, subtracting the min vale from the column
         O(n)
     """
     def reduceCol(self, col, min, minIndex):
-        for row in range(len(self.costMatrix)):
-            newCost = self.costMatrix[row][col] - min
-            if newCost == np.nan:
-                self.costMatrix[row][col] = np.inf
-            else:
-                self.costMatrix[row, col] = newCost
-    """
-        Iterates through a row to find a minimum value and it's location
+        self.costMatrix[:, col] -= min
+    """
+        Finds the minimum value of a row and it's location
         O(n)
     """
     def findRowMin(self, row):
-        min = self.costMatrix[row][0]
-        minIndex = 0
-        for col in range(len(self.costMatrix[row])):
-            if self.costMatrix[row][col] < min:
-                min = self.costMatrix[row][col]
-                minIndex = col
-        
-        return min, minIndex
+        minIndex = int(np.argmin(self.costMatrix[row]))
+        return self.costMatrix[row, minIndex], minIndex
     """
-        Iterates through a column to find a minimum value and it's location
+        Finds the minimum value of a column and it's location
         O(n)
     """
     def findColMin(self, col):
-        min = self.costMatrix[0][col]
-        minIndex = 0
-        row = 0
-        for row in range(len(self.costMatrix)):
-            if self.costMatrix[row][col] < min:
-                min = self.costMatrix[row][col]
-                minIndex = row
-        return min, minIndex
+        minIndex = int(np.argmin(self.costMatrix[:, col]))
+        return self.costMatrix[minIndex, col], minIndex
 
     """
-        Iterates through a row and sets each value to infinity
+        Sets each value of a row to infinity
         O(n)
     """
     def infRow(self, row):
-        for i in range(len(self.costMatrix[row])):
-            self.costMatrix[row][i] = np.inf
+        self.costMatrix[row] = np.inf
     """
-        Iterates through a column and sets each value to infinity
+        Sets each value of a column to infinity
         O(n)
     """
     def infCol(self, col):
-        for i in range(len(self.costMatrix)):
-            self.costMatrix[i][col] = np.inf
+        self.costMatrix[:, col] = np.inf
     """
         Sets the cost from the column city to the row city to infinity
         O(1)
     """
     def infPair(self, row, col):
         self.costMatrix[col][row] = np.inf
-        
-    
\ No newline at end of file
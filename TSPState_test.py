@@ -52,21 +52,22 @@ class TestTSPState(unittest.TestCase):
         self.testScenario = Scenario(proj5Gui.newPoints(), "Hard (Deterministic)", 20)
         self.states = []
         for i in range(10):
-            state = TSPState(np.zeros(random.randint(1, 20)), self.testScenario.getCities(), random.randint(1,20))
+            state = TSPState(np.zeros(random.randint(1, 20), dtype=int), random.randint(1,20))
             if i % 2 == 0:
                 self.states.append(deepcopy(state))
             self.states.append(state)
 
-        self.testState = TSPState(self.testScenario.getCities(), self.testScenario.getCities(), 0)
-        self.testState.initMatrix()
+        self.cityIndices = [city._index for city in self.testScenario.getCities()]
+        self.testState = TSPState(self.cityIndices, 0)
+        self.testState.initMatrix(self.testScenario)
         print(self.testState.costMatrix)
         self.oldMatrix = deepcopy(self.testState.costMatrix)
 
     def test_init(self):
-        state = TSPState(self.testScenario.getCities(), self.testScenario.getCities(), 0)
-        self.assertEqual(state.path, self.testScenario.getCities())
-        self.assertEqual(state.cities, self.testScenario.getCities())
-        state.initMatrix()
+        state = TSPState(self.cityIndices, 0)
+        self.assertEqual(list(state.path), self.cityIndices)
+        self.assertEqual(state.visited, (1 << len(self.cityIndices)) - 1)
+        state.initMatrix(self.testScenario)
 
         row_index = 0
         col_index = 0
@@ -77,6 +78,67 @@ class TestTSPState(unittest.TestCase):
                 col_index += 1
             row_index += 1
     
+    def test_in_path(self):
+        state = TSPState([0, 3, 5], 0)
+        for city in range(len(self.cityIndices)):
+            self.assertEqual(state.inPath(city), city in [0, 3, 5])
+
+    def test_expand(self):
+        root = TSPState([0], 0)
+        root.initMatrix(self.testScenario)
+        root.reduceMatrix()
+        child = root.expand(4)
+        self.assertEqual(list(child.path), [0, 4])
+        self.assertTrue(child.inPath(4))
+        self.assertFalse(root.inPath(4))
+
+        manual = TSPState([0, 4], root.bestCost, np.copy(root.costMatrix))
+        manual.coverCities(0, 4)
+        manual.reduceMatrix()
+        self.assertEqual(child.bestCost, manual.bestCost)
+        self.assertTrue(np.array_equal(child.costMatrix, manual.costMatrix))
+
+    def test_lazy_expand(self):
+        root = TSPState([0], 0)
+        root.initMatrix(self.testScenario)
+        root.reduceMatrix()
+        for first in range(1, 5):
+            parent = root.expand(first, lazy=True)
+            self.assertIsNone(parent.costMatrix)
+            for city in range(1, 5):
+                if city == first:
+                    continue
+                child = parent.expand(city)
+                manual = TSPState([0, first], root.bestCost, np.copy(root.costMatrix))
+                manual.coverCities(0, first)
+                manual.reduceMatrix()
+                manual.coverCities(first, city)
+                manual.reduceMatrix()
+                self.assertEqual(child.bestCost, manual.bestCost)
+                self.assertTrue(np.array_equal(child.costMatrix, manual.costMatrix))
+
+    def test_float32_matrix(self):
+        state = TSPState([0], 0)
+        state.initMatrix(self.testScenario, np.float32)
+        self.assertEqual(state.costMatrix.dtype, np.float32)
+        state.reduceMatrix()
+        reference = TSPState([0], 0)
+        reference.initMatrix(self.testScenario)
+        reference.reduceMatrix()
+        self.assertEqual(state.bestCost, reference.bestCost)
+        self.assertEqual(state.expand(4).bestCost, reference.expand(4).bestCost)
+        with self.assertRaises(ValueError):
+            state.initMatrix(self.testScenario, np.int32)
+
+    def test_scenario_cost_matrix(self):
+        matrix = self.testScenario.costMatrix
+        for fromCity in self.testScenario.getCities():
+            for toCity in self.testScenario.getCities():
+                self.assertEqual(matrix[fromCity._index][toCity._index], fromCity.costTo(toCity))
+        self.assertIs(matrix, self.testScenario.costMatrix)
+        with self.assertRaises(ValueError):
+            matrix[0][1] = 0
+
     def test_find_row_min(self):
         min, minIndex = self.testState.findRowMin(2)
         self.assertEqual(min, 246)
@@ -154,6 +216,14 @@ class TestTSPState(unittest.TestCase):
                     "\ncol_index " + str(col_index))
         self.assertEqual(newBest, self.testState.bestCost)
     
+    def test_reduce_matrix_bound(self):
+        self.testState.bestCost = 7
+        reduction = self.testState.reduceMatrix()
+        self.assertEqual(self.testState.bestCost, 7 + reduction)
+        self.assertTrue((self.testState.costMatrix.min(axis=1) == 0).all())
+        self.assertTrue((self.testState.costMatrix.min(axis=0) == 0).all())
+        self.assertEqual(self.testState.reduceMatrix(), 0)
+
     def test_reduce_to_0(self):
         min, minIndex = self.testState.findRowMin(2)
         print("min is " + str(min) + " at index " + str(minIndex))
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+
+import time
+import random
+from TSPLocalSearch import TSPLocalSearch
+
+
+
+''' <summary>
+	Iterated 3-opt local search for asymmetric costs ("3-opt + kicks").  This is not
+	Lin-Kernighan: the move depth is fixed at three edges, there is no variable-depth
+	chain.
+
+	On top of 2-opt and Or-opt, each city tries a sequential 3-opt move: starting from
+	the edge (t1, t2) leaving the city, it adds a cheaper edge from t1 taken from the
+	candidate list, removes the edge that must go, adds a second candidate edge and
+	closes the tour, giving up on a branch as soon as the running gain is no longer
+	positive.  The only move it builds is the segment exchange A B C -> A C B, which
+	keeps every segment's direction, so it needs no reversal and its gain is exact for
+	asymmetric costs.
+
+	Once the tour is locally optimal the search kicks it with a random segment exchange
+	of nearby segments (the double-bridge kick), re-optimizes only around the changed
+	edges, and keeps the result if it is no worse than the best tour so far, until the
+	deadline.
+	</summary>
+'''
+
+class TSPThreeOpt( TSPLocalSearch ):
+	MAX_KICK_SEGMENT = 50
+
+	def __init__( self, costMatrix, route, neighbors=TSPLocalSearch.NEIGHBORS, seed=None ):
+		super().__init__( costMatrix, route, neighbors )
+		self.threeOptMoves = 0
+		self.kicks = 0
+		self.improvements = 0
+		self._random = random.Random( seed )
+
+	def _improveCity( self, a ):
+		touched = super()._improveCity( a )
+		if touched is None:
+			touched = self._threeOptFrom( a )
+		return touched
+
+	def _threeOptFrom( self, a ):
+		c, pos, n, t = self.costs, self.pos, self.n, self.tour
+		if n < 6:
+			return None
+		i = pos[a]
+		b = t[(i+1) % n]
+		for d in self.outNeighbors[a]:						# add (t1=a, d), remove (e, d)
+			g1 = c[a][b] - c[a][d]
+			if g1 <= 0:
+				break
+			offD = (pos[d] - i) % n
+			if offD < 2:
+				continue
+			e = t[(i + offD - 1) % n]
+			for f in self.outNeighbors[e]:					# add (e, f), remove (pred f, f), close with (pred f, b)
+				g2 = g1 + c[e][d] - c[e][f]
+				if g2 <= 0:
+					break
+				offF = (pos[f] - i) % n or n
+				if offF < offD + 1:
+					continue
+				k = t[(i + offF - 1) % n]
+				self.evaluated += 1
+				if g2 + c[k][f] - c[k][b] > 0:
+					return self._applySegmentExchange( i, offD, offF )
+		return None
+
+	''' <summary>
+		Turns t[i] B C D into t[i] C B D, where B starts at offset 1 from i, C at offset
+		offD and D at offset offF.  Swapping two of the three segments B, C and D t[i]
+		gives the same cyclic tour whichever segment stays put, so the longest does
+		and only the other two are rewritten.
+		</summary>
+	'''
+	def _applySegmentExchange( self, i, offD, offF ):
+		n = self.n
+		lengths = (offD - 1, offF - offD, n + 1 - offF)					# B, C and D t[i]
+		starts = ((i + 1) % n, (i + offD) % n, (i + offF) % n)
+		touched = [self.tour[start - 1] for start in starts] + [self.tour[start] for start in starts]
+		kept = lengths.index( max(lengths) )
+		first, second = (kept + 1) % 3, (kept + 2) % 3
+		self._rewrite( starts[first], self._window(starts[second], lengths[second]) +
+										self._window(starts[first], lengths[first]) )
+		self.threeOptMoves += 1
+		return touched
+
+	def _kick( self ):
+		n = self.n
+		longest = max( 1, min(self.MAX_KICK_SEGMENT, (n - 1) // 3) )
+		i = self._random.randrange( n )
+		lengthB = self._random.randint( 1, longest )
+		lengthC = self._random.randint( 1, longest )
+		touched = self._applySegmentExchange( i, 1 + lengthB, 1 + lengthB + lengthC )
+		self.kicks += 1
+		return touched
+
+	''' <summary>
+		Local search to a local optimum, then kick and re-optimize until the deadline.
+		onImprove(route, cost) is called with every better tour and onProgress() every
+		PROGRESS_INTERVAL seconds; if either returns True the search stops.
+		</summary>
+		<returns>the best route found as a list of city indices</returns>
+	'''
+	def solve( self, deadline, onImprove=None, onProgress=None ):
+		stopped = []
+		def improved( route, cost ):
+			if onImprove is not None and onImprove( route, cost ):
+				stopped.append( True )
+			return bool(stopped)
+		def progressed():
+			if onProgress is not None and onProgress():
+				stopped.append( True )
+			return bool(stopped)
+		self.improve( deadline, onImprove=improved, onProgress=progressed )
+		if self.n < 8:
+			return self.tour
+		bestCost = self.cost()
+		while not stopped and time.time() < deadline:
+			self._journal = []											# logs the kick and the moves after it
+			touched = self._kick()
+			self.improve( deadline, touched, onProgress=progressed )
+			cost = self.cost()
+			if cost <= bestCost:
+				if cost < bestCost:
+					self.improvements += 1
+					improved( self.tour, cost )
+				bestCost = cost
+			else:
+				self._undo()												# back to the best tour
+		self._journal = None
+		return self.tour
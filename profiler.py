@@ -1,7 +1,13 @@
 import cProfile
+import pstats
+import sys
 
-import Proj5GUI
+import TSPBenchmark
 
+# Profiles a headless benchmark run; takes the same arguments as TSPBenchmark.py
 if __name__ == "__main__":
-    foo.disable()
-    foo.print_stats(sort="time")
+    profile = cProfile.Profile()
+    profile.enable()
+    TSPBenchmark.main(sys.argv[1:])
+    profile.disable()
+    pstats.Stats(profile).sort_stats("time").print_stats(30)